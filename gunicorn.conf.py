@@ -0,0 +1,28 @@
+# Configuracion de gunicorn (Procfile / render.yaml: gunicorn -c gunicorn.conf.py ...)
+import os
+import shutil
+
+# gthread: cada stream SSE ocupa un hilo mientras esta abierto; la app lee
+# GUNICORN_THREADS para dejar hilos libres (ver src/api/events.py)
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+os.environ["GUNICORN_THREADS"] = str(threads)
+
+# /metrics suma los contadores de todos los workers desde este directorio
+# (ver src/api/metrics.py); tiene que existir antes de cargar la app
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+
+def on_starting(server):
+    # cada arranque empieza con los contadores a cero
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
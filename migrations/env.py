@@ -90,9 +90,23 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # la busqueda de texto completo vive fuera de los modelos (columna generada
+    # notes.search_vector en Postgres, tabla FTS5 notes_fts en SQLite); que el
+    # autogenerate no proponga borrarlas
+    def include_object(object, name, type_, reflected, compare_to):
+        if type_ == 'table' and name.startswith('notes_fts'):
+            return False
+        if type_ == 'column' and name == 'search_vector':
+            return False
+        if type_ == 'index' and name == 'ix_notes_search_vector':
+            return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,41 @@
+"""notification kind, actor and unread counter
+
+Revision ID: 1f6b8d2e4c95
+Revises: e3a9d5f7c210
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f6b8d2e4c95'
+down_revision = 'e3a9d5f7c210'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('kind', sa.String(length=20), server_default='comment', nullable=False))
+        batch_op.add_column(sa.Column('actor_user_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_notifications_actor_user_id', 'user', ['actor_user_id'], ['id'])
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        'UPDATE "user" SET unread_notifications = (SELECT COUNT(*) FROM notifications '
+        'WHERE notifications.recipient_user_id = "user".id AND notifications.is_read = false)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
+
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_notifications_actor_user_id', type_='foreignkey')
+        batch_op.drop_column('actor_user_id')
+        batch_op.drop_column('kind')
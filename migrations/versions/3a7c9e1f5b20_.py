@@ -0,0 +1,46 @@
+"""unique votes per user and target
+
+Revision ID: 3a7c9e1f5b20
+Revises: 1f6b8d2e4c95
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a7c9e1f5b20'
+down_revision = '1f6b8d2e4c95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # los dobles clicks dejaron votos repetidos: nos quedamos con el mas reciente
+    for key in ('note_id', 'comment_id'):
+        op.execute(
+            f"DELETE FROM votes WHERE {key} IS NOT NULL AND vote_id < ("
+            f"SELECT MAX(v2.vote_id) FROM votes v2 "
+            f"WHERE v2.user_id = votes.user_id AND v2.{key} = votes.{key})"
+        )
+
+    with op.batch_alter_table('votes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_unique_constraint('uq_votes_user_note', ['user_id', 'note_id'])
+        batch_op.create_unique_constraint('uq_votes_user_comment', ['user_id', 'comment_id'])
+
+    # al borrar duplicados los contadores quedan altos: se recalculan
+    for table, key in (('notes', 'note_id'), ('comments', 'comment_id')):
+        op.execute(
+            f"UPDATE {table} SET "
+            f"positive_votes = (SELECT COUNT(*) FROM votes WHERE votes.{key} = {table}.{key} AND votes.vote_type = 1), "
+            f"negative_votes = (SELECT COUNT(*) FROM votes WHERE votes.{key} = {table}.{key} AND votes.vote_type = -1)"
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('votes', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_votes_user_comment', type_='unique')
+        batch_op.drop_constraint('uq_votes_user_note', type_='unique')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,44 @@
+"""vote counters on notes and comments
+
+Revision ID: 5b1e7c3d9a42
+Revises: df605bc7a26c
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7c3d9a42'
+down_revision = 'df605bc7a26c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('positive_votes', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('negative_votes', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('positive_votes', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('negative_votes', sa.Integer(), server_default='0', nullable=False))
+
+    # rellenamos los contadores con los votos que ya existen
+    for table, key in (('notes', 'note_id'), ('comments', 'comment_id')):
+        op.execute(
+            f"UPDATE {table} SET "
+            f"positive_votes = (SELECT COUNT(*) FROM votes WHERE votes.{key} = {table}.{key} AND votes.vote_type = 1), "
+            f"negative_votes = (SELECT COUNT(*) FROM votes WHERE votes.{key} = {table}.{key} AND votes.vote_type = -1)"
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_column('negative_votes')
+        batch_op.drop_column('positive_votes')
+
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.drop_column('negative_votes')
+        batch_op.drop_column('positive_votes')
@@ -0,0 +1,30 @@
+"""trending score on notes
+
+Revision ID: 7d4b2f8e6a13
+Revises: 3a7c9e1f5b20
+Create Date: 2026-10-18 16:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4b2f8e6a13'
+down_revision = '3a7c9e1f5b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # las notas existentes empiezan en 0 (el feed cae a "mas nuevas primero");
+    # para puntuarlas: flask decay-trending --rebuild
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trending_score', sa.Float(), server_default='0', nullable=False))
+        batch_op.create_index('ix_notes_trending_score', ['trending_score', 'note_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notes', schema=None) as batch_op:
+        batch_op.drop_index('ix_notes_trending_score')
+        batch_op.drop_column('trending_score')
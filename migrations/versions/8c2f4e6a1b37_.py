@@ -0,0 +1,46 @@
+"""normalized tag name for prefix search
+
+Revision ID: 8c2f4e6a1b37
+Revises: 5b1e7c3d9a42
+Create Date: 2026-10-18 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2f4e6a1b37'
+down_revision = '5b1e7c3d9a42'
+branch_labels = None
+depends_on = None
+
+
+def normalize_tag_name(name):
+    # copia de api.models.normalize_tag_name, congelada para esta migracion
+    decomposed = unicodedata.normalize('NFKD', (name or '').strip().lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def upgrade():
+    with op.batch_alter_table('tags', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name_normalized', sa.String(length=50), nullable=True))
+
+    bind = op.get_bind()
+    tags = sa.table('tags', sa.column('tag_id', sa.Integer), sa.column('name', sa.String),
+                    sa.column('name_normalized', sa.String))
+    for tag_id, name in bind.execute(sa.select(tags.c.tag_id, tags.c.name)).fetchall():
+        bind.execute(tags.update().where(tags.c.tag_id == tag_id).values(
+            name_normalized=normalize_tag_name(name)))
+
+    with op.batch_alter_table('tags', schema=None) as batch_op:
+        batch_op.alter_column('name_normalized', existing_type=sa.String(length=50), nullable=False)
+        batch_op.create_index('ix_tags_name_normalized', ['name_normalized'], unique=False,
+                              postgresql_ops={'name_normalized': 'text_pattern_ops'})
+
+
+def downgrade():
+    with op.batch_alter_table('tags', schema=None) as batch_op:
+        batch_op.drop_index('ix_tags_name_normalized')
+        batch_op.drop_column('name_normalized')
@@ -0,0 +1,59 @@
+"""secondary indexes for hot query predicates
+
+Revision ID: b5e8d1c4f902
+Revises: 7d4b2f8e6a13
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e8d1c4f902'
+down_revision = '7d4b2f8e6a13'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas). Votes (user_id, note_id/comment_id) ya lo cubren
+# las restricciones unicas uq_votes_user_note y uq_votes_user_comment.
+INDEXES = [
+    ('ix_notes_created_at', 'notes', ['created_at', 'note_id']),
+    ('ix_notes_user_id', 'notes', ['user_id', 'created_at']),
+    ('ix_comments_note_id', 'comments', ['note_id', 'created_at']),
+    ('ix_votes_note_id_vote_type', 'votes', ['note_id', 'vote_type']),
+    ('ix_votes_comment_id_vote_type', 'votes', ['comment_id', 'vote_type']),
+    ('ix_user_note_favorites_user_created', 'user_note_favorites', ['user_id', 'created_at', 'note_id']),
+    ('ix_user_note_favorites_note_id', 'user_note_favorites', ['note_id']),
+    ('ix_notifications_recipient', 'notifications', ['recipient_user_id', 'notification_id']),
+    ('ix_notifications_recipient_unread', 'notifications', ['recipient_user_id', 'is_read']),
+    ('ix_notifications_note_id', 'notifications', ['note_id']),
+    ('ix_notifications_comment_id', 'notifications', ['comment_id']),
+    ('ix_reports_note_id', 'reports', ['note_id']),
+    ('ix_reports_comment_id', 'reports', ['comment_id']),
+    ('ix_note_tags_tag_id', 'note_tags', ['tag_id', 'note_id']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY no bloquea escrituras pero no puede ir en una transaccion.
+        # Si falla a medias deja un indice INVALID: borrarlo y volver a correr.
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
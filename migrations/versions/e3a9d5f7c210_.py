@@ -0,0 +1,44 @@
+"""full-text search over notes
+
+Revision ID: e3a9d5f7c210
+Revises: 8c2f4e6a1b37
+Create Date: 2026-10-18 11:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a9d5f7c210'
+down_revision = '8c2f4e6a1b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # columna generada: Postgres la recalcula en cada insert/update de la nota
+        op.execute(
+            "ALTER TABLE notes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('spanish', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('spanish', coalesce(content, '')), 'B')"
+            ") STORED"
+        )
+        op.execute("CREATE INDEX ix_notes_search_vector ON notes USING GIN (search_vector)")
+    elif bind.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+            "title, content, tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute("INSERT INTO notes_fts(rowid, title, content) SELECT note_id, title, content FROM notes")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_notes_search_vector")
+        op.execute("ALTER TABLE notes DROP COLUMN IF EXISTS search_vector")
+    elif bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS notes_fts")
@@ -1,9 +1,46 @@
   
+import hmac
 import os
-from flask_admin import Admin
+from flask import redirect, request, session, url_for
+from flask_admin import Admin, BaseView, expose
 from .models import db, User, Notes, Comments, Tags, Reports, Notifications, UserNoteFavorites, Votes
+from .profiler import request_profiler
 from flask_admin.contrib.sqla import ModelView
 
+
+PROFILES_SESSION_KEY = 'admin_profiles'
+
+
+class RequestProfilesView(BaseView):
+    # perfiles capturados con la cabecera X-Profile (ver api/profiler.py): el
+    # texto SQL (sin parametros), las lineas que lo lanzaron y el cProfile de
+    # peticiones reales. Se pide lo mismo que para perfilar (X-Profile-Secret o
+    # un JWT con rol admin); desde el navegador, PROFILER_SECRET en el
+    # formulario de la propia vista, que se recuerda en la sesion
+    def is_accessible(self):
+        token = request_profiler.session_token()
+        remembered = session.get(PROFILES_SESSION_KEY)
+        if token and remembered and hmac.compare_digest(remembered.encode("utf-8"), token.encode("utf-8")):
+            return True
+        return request_profiler.authorized()
+
+    def inaccessible_callback(self, name, **kwargs):
+        error = None
+        if request.method == 'POST':
+            if request_profiler.check_secret(request.form.get('secret')):
+                session[PROFILES_SESSION_KEY] = request_profiler.session_token()
+                return redirect(url_for('.index'))
+            error = 'Wrong secret'
+        return self.render('admin/request_profiles_login.html', error=error,
+                           configured=bool(request_profiler.secret)), 403
+
+    @expose('/', methods=('GET', 'POST'))
+    def index(self):
+        entry = request_profiler.get(request.args.get('id'))
+        entries = list(reversed(request_profiler.entries))
+        return self.render('admin/request_profiles.html', entries=entries, entry=entry)
+
+
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
@@ -19,6 +56,7 @@ def setup_admin(app):
     admin.add_view(ModelView(Notifications, db.session))
     admin.add_view(ModelView(UserNoteFavorites, db.session))
     admin.add_view(ModelView(Votes, db.session))
+    admin.add_view(RequestProfilesView(name='Profiles', endpoint='profiles'))
 
     # You can duplicate that line to add mew models
     # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
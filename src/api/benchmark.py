@@ -0,0 +1,231 @@
+"""
+Benchmark de carga de la API.
+
+Los datos salen de api/seed.py (--seed-data llena una base vacia, SQLite o un
+Postgres local, siempre igual para la misma semilla).
+run_benchmark() lanza N clientes concurrentes contra las rutas calientes de
+SCENARIOS y devuelve, por escenario, p50/p95/p99, peticiones por segundo y
+sentencias SQL por peticion como un dict serializable a JSON.
+compare_to_baseline() lo compara con un resultado guardado:
+    $ flask bench-api --seed-data --notes 5000 --output bench.json
+    $ flask bench-api --baseline bench.json      (sale con 1 si empeora)
+
+Por defecto usa el test client dentro del proceso: es la app real con su base
+de datos, sin red ni gunicorn, y permite contar el SQL de cada peticion. Con
+--url las peticiones van por HTTP a un servidor ya arrancado (sin conteo de SQL).
+Dentro del proceso se vacia response_cache antes de cada peticion, como en
+audit_hot_paths: se mide la ruta y no la cache (con --url no se puede, y las
+GET repetidas pueden salir de ella).
+
+El escenario vote escribe en la base: en una segunda pasada los mismos votos
+cambian de signo (200) en vez de crearse (201). Cada ejecucion que se compare
+tiene que empezar con la base recien generada (--seed-data sobre una base
+vacia). meta.data guarda cuantas filas habia al empezar y
+baseline_data_differs() detecta si no coincide con la linea base.
+"""
+import datetime
+import json
+import platform
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func
+
+from api.cache import response_cache
+from api.models import db, User, Notes, Comments, Votes, UserNoteFavorites
+from api.seed import SEED_PASSWORD
+
+# (nombre, metodo, ruta, body, con JWT); {note_id}, {email}... se rellenan por peticion
+SCENARIOS = [
+    ("notes", "GET", "/api/notes", None, False),
+    ("note_detail", "GET", "/api/notes/{note_id}", None, False),
+    ("comments", "GET", "/api/notes/{note_id}/comments", None, False),
+    ("favorites", "GET", "/api/favorites", None, True),
+    ("vote", "POST", "/api/vote", {"note_id": "{note_id}", "vote_type": "{vote_type}"}, True),
+    ("token", "POST", "/api/token", {"email": "{email}", "password": SEED_PASSWORD}, False),
+]
+
+# cuanto puede empeorar cada metrica respecto a la linea base antes de fallar
+DEFAULT_TOLERANCE = 0.2
+
+
+def percentile(values, fraction):
+    # nearest-rank sobre la lista ya ordenada
+    if not values:
+        return None
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class _StatementCounter:
+    # cuenta el SQL de cada peticion del test client (se ejecuta en el hilo del cliente)
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.local.count = getattr(self.local, "count", 0) + 1
+
+    def take(self):
+        count = getattr(self.local, "count", 0)
+        self.local.count = 0
+        return count
+
+
+def data_fingerprint():
+    # filas de las tablas que tocan los escenarios, antes de empezar
+    return {model.__tablename__: db.session.query(func.count()).select_from(model).scalar()
+            for model in (User, Notes, Comments, Votes, UserNoteFavorites)}
+
+
+def baseline_data_differs(current, baseline):
+    previous = baseline.get("meta", {}).get("data")
+    return previous is not None and previous != current["meta"]["data"]
+
+
+def _fill(value, values):
+    if isinstance(value, str) and value.startswith("{"):
+        return values[value[1:-1]]
+    if isinstance(value, dict):
+        return {key: _fill(item, values) for key, item in value.items()}
+    return value
+
+
+def _http_request(base_url, method, path, body, headers):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url.rstrip("/") + path, data=data, method=method,
+                                     headers={**headers, "Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+
+def run_benchmark(app, requests=200, concurrency=8, warmup=20, seed=42, base_url=None,
+                  scenarios=SCENARIOS, token_users=50):
+    with app.app_context():
+        users = db.session.execute(
+            db.select(User.id, User.email).order_by(User.id).limit(token_users)).all()
+        note_range = db.session.execute(db.select(func.min(Notes.note_id), func.max(Notes.note_id))).one()
+        if not users or note_range[0] is None:
+            return None
+        tokens = [(email, {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"})
+                  for user_id, email in users]
+        engine = db.engine
+        dialect = engine.dialect.name
+        data = data_fingerprint()
+
+    counter = _StatementCounter()
+    client = app.test_client() if base_url is None else None
+
+    def send(method, path, body, authenticated, rng):
+        email, headers = rng.choice(tokens)
+        values = {"note_id": rng.randint(*note_range), "vote_type": rng.choice((1, -1)), "email": email}
+        path, body = path.format(**values), _fill(body, values)
+        headers = headers if authenticated else {}
+        start = time.perf_counter()
+        if client is not None:
+            response_cache.clear()
+            counter.take()
+            status = client.open(path, method=method, json=body, headers=headers).status_code
+            statements = counter.take()
+        else:
+            status = _http_request(base_url, method, path, body, headers)
+            statements = None
+        return time.perf_counter() - start, status, statements
+
+    results = {}
+    if client is not None:
+        event.listen(engine, "before_cursor_execute", counter)
+    try:
+        for index, (name, method, path, body, authenticated) in enumerate(scenarios):
+            rng = random.Random(seed + index)
+            for _ in range(warmup):
+                send(method, path, body, authenticated, rng)
+
+            # cada hilo con su propio generador: misma secuencia en cada ejecucion
+            per_client = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+            def run_client(i, count):
+                client_rng = random.Random(seed * 1000 + index * 100 + i)
+                return [send(method, path, body, authenticated, client_rng) for _ in range(count)]
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as clients:
+                samples = [sample for future in [clients.submit(run_client, i, count)
+                                                 for i, count in enumerate(per_client)]
+                           for sample in future.result()]
+            elapsed = time.perf_counter() - start
+            results[name] = _summarize(method, path, samples, elapsed)
+    finally:
+        if client is not None:
+            event.remove(engine, "before_cursor_execute", counter)
+
+    return {
+        "meta": {
+            "created_at": datetime.datetime.utcnow().isoformat(),
+            "target": base_url or "in-process",
+            "database": dialect,
+            "python": platform.python_version(),
+            "requests": requests,
+            "concurrency": concurrency,
+            "seed": seed,
+            "data": data,
+        },
+        "scenarios": results,
+    }
+
+
+def _summarize(method, path, samples, elapsed):
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    statements = [sample[2] for sample in samples if sample[2] is not None]
+    return {
+        "request": f"{method} {path}",
+        "requests": len(samples),
+        "errors": sum(1 for _, status, _ in samples if status >= 500),
+        "statuses": statuses,
+        "throughput_rps": len(samples) / elapsed if elapsed else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": latencies[-1] if latencies else None,
+        },
+        "queries_per_request": sum(statements) / len(statements) if statements else None,
+    }
+
+
+def compare_to_baseline(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Devuelve [(escenario, metrica, linea base, actual)] con lo que empeoro."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        checks = (
+            ("p95_ms", previous["latency_ms"]["p95"], result["latency_ms"]["p95"], 1 + tolerance),
+            ("p99_ms", previous["latency_ms"]["p99"], result["latency_ms"]["p99"], 1 + tolerance),
+            # tambien con margen: la cache y el orden de los votos entre hilos varian un poco
+            ("queries_per_request", previous["queries_per_request"], result["queries_per_request"],
+             1 + tolerance),
+        )
+        for metric, before, after, limit in checks:
+            if before is not None and after is not None and after > before * limit + 1e-9:
+                regressions.append((name, metric, before, after))
+        before, after = previous["throughput_rps"], result["throughput_rps"]
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append((name, "throughput_rps", before, after))
+        if result["errors"] > previous["errors"]:
+            regressions.append((name, "errors", previous["errors"], result["errors"]))
+    return regressions
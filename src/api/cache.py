@@ -0,0 +1,139 @@
+"""
+Cache de respuestas para los GET publicos del blueprint api.
+
+Cada respuesta cacheada depende de uno o varios "recursos" ("notes", "tags",
+"note:5", "note:5:comments"). Cada recurso tiene un numero de version en
+memoria; los endpoints de escritura llaman a invalidate() con los recursos
+que tocan, lo que sube su version y descarta solo las entradas afectadas.
+
+El ETag es un hash del cuerpo y se guarda con la entrada: mientras la entrada
+sea valida, If-None-Match se contesta con 304 sin tocar la base de datos. Como
+las versiones son por proceso, una escritura atendida por otro worker no
+invalida la entrada de este, pero al caducar (ttl segundos) se vuelve a
+generar el cuerpo y, si cambio, tambien el ETag, asi que los clientes ven el
+cambio como mucho ttl segundos despues. Dos workers con el mismo cuerpo dan el
+mismo ETag.
+"""
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, make_response
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._dependents = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag_for(body):
+        return hashlib.sha1(body).hexdigest()[:20]
+
+    def versions_for(self, resources):
+        with self._lock:
+            return tuple(self._versions.get(resource, 0) for resource in resources)
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["versions"] != versions or time.monotonic() - entry["stored_at"] > self.ttl:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, versions, resources, body, mimetype):
+        # versions son las de antes de generar el cuerpo: si hubo una escritura
+        # entre medias, la entrada ya nace caducada
+        etag = self.etag_for(body)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = {
+                "etag": etag,
+                "versions": versions,
+                "resources": tuple(resources),
+                "body": body,
+                "mimetype": mimetype,
+                "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            for resource in resources:
+                self._dependents.setdefault(resource, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        return etag
+
+    def _drop(self, key):
+        # quita la entrada y su clave de los recursos de los que dependia, para
+        # que _dependents no crezca con claves que ya no estan (llamar con _lock)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for resource in entry["resources"]:
+            keys = self._dependents.get(resource)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[resource]
+
+    def invalidate(self, *resources):
+        with self._lock:
+            for resource in resources:
+                self._versions[resource] = self._versions.get(resource, 0) + 1
+                for key in list(self._dependents.get(resource, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dependents.clear()
+
+
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024)),
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", 30)),
+)
+
+
+def cached_response(*resource_templates):
+    """
+    Decorador para GET publicos. Los recursos se escriben como plantillas con
+    los argumentos de la ruta, por ejemplo @cached_response("note:{note_id}").
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            resources = [template.format(**kwargs) for template in resource_templates]
+            key = request.full_path
+            versions = response_cache.versions_for(resources)
+
+            entry = response_cache.get(key, versions)
+            if entry is not None:
+                response = make_response(entry["body"], 200)
+                response.mimetype = entry["mimetype"]
+                etag = entry["etag"]
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                etag = response_cache.set(key, versions, resources,
+                                          response.get_data(), response.mimetype)
+
+            response.set_etag(etag)
+            # el navegador puede guardarla pero debe revalidar con If-None-Match
+            response.cache_control.no_cache = True
+            # convierte la respuesta en 304 si el ETag coincide con If-None-Match
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
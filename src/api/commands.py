@@ -1,6 +1,20 @@
 
 import click
-from api.models import db, User
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, case, update
+from api.models import db, User, Notes, Comments, Votes, Notifications
+from api.passwords import password_hasher
+from api.static_assets import compress_static
+from api.images import prune_profile_pictures
+from api.trending import decay_trending, rebuild_trending
+from api.query_plans import audit_hot_paths, count_hot_path_queries
+from api.nplusone import check_hot_paths, nplusone_detector
+from api.benchmark import DEFAULT_TOLERANCE, baseline_data_differs, compare_to_baseline, run_benchmark
+from api.seed import scaled_sizes, seed_database
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
@@ -9,26 +23,322 @@ with youy database, for example: Import the price of bitcoin every night as 12am
 """
 def setup_commands(app):
     
-    """ 
-    This is an example command "insert-test-users" that you can run from the command line
-    by typing: $ flask insert-test-users 5
-    Note: 5 is the number of users to add
-    """
-    @app.cli.command("insert-test-users") # name of our command
-    @click.argument("count") # argument of out command
-    def insert_test_users(count):
-        print("Creating test users")
-        for x in range(1, int(count) + 1):
-            user = User()
-            user.email = "test_user" + str(x) + "@test.com"
-            user.password = "123456"
-            user.is_active = True
-            db.session.add(user)
+    """
+    Genera datos sinteticos en una base vacia, todas las tablas y con los
+    contadores cuadrados (ver api/seed.py). --scale multiplica los tamanos por
+    defecto (unas 47.000 filas); cada tabla se puede fijar a mano:
+    $ flask seed --scale 100 --seed 42
+    $ flask seed --users 50 --notes 200 --now 2025-01-01
+    Todos los usuarios entran con la contrasena "seed-password".
+    """
+    @app.cli.command("seed")
+    @click.option("--scale", default=1.0, help="Multiplicador de los tamanos por defecto")
+    @click.option("--seed", "seed_value", default=42, help="Semilla: misma semilla, mismos datos")
+    @click.option("--now", default=None, help="Fecha de referencia (YYYY-MM-DD) para datos identicos")
+    @click.option("--users", type=int, default=None)
+    @click.option("--tags", type=int, default=None)
+    @click.option("--notes", type=int, default=None)
+    @click.option("--comments", type=int, default=None)
+    @click.option("--note-votes", type=int, default=None)
+    @click.option("--comment-votes", type=int, default=None)
+    @click.option("--favorites", type=int, default=None)
+    @click.option("--reports", type=int, default=None)
+    @click.option("--notifications", type=int, default=None)
+    def seed(scale, seed_value, now, **overrides):
+        sizes = scaled_sizes(scale, **overrides)
+        now = datetime.datetime.strptime(now, "%Y-%m-%d") if now else None
+        start = time.monotonic()
+        try:
+            written = seed_database(sizes, seed=seed_value, now=now)
+        except ValueError as e:
+            print(f"No se puede generar: {e}")
+            raise SystemExit(1)
+        print(f"{sum(written.values())} filas en {time.monotonic() - start:.1f}s")
+
+    """
+    Recalcula los contadores positive_votes/negative_votes de notas y comentarios
+    a partir de la tabla votes y corrige los que no cuadren, por lotes:
+    $ flask recount-votes --chunk-size 1000
+    """
+    @app.cli.command("recount-votes")
+    @click.option("--chunk-size", default=1000, help="Filas por lote")
+    def recount_votes(chunk_size):
+        targets = (
+            ("notes", Notes, Notes.note_id, Votes.note_id),
+            ("comments", Comments, Comments.comment_id, Votes.comment_id),
+        )
+        for label, model, key, vote_key in targets:
+            last_id = 0
+            checked = 0
+            repaired = 0
+            while True:
+                rows = db.session.query(key, model.positive_votes, model.negative_votes).filter(
+                    key > last_id).order_by(key).limit(chunk_size).all()
+                if not rows:
+                    break
+                ids = [row[0] for row in rows]
+
+                totals = {
+                    row_id: (int(positive or 0), int(negative or 0))
+                    for row_id, positive, negative in db.session.query(
+                        vote_key,
+                        func.sum(case((Votes.vote_type == 1, 1), else_=0)),
+                        func.sum(case((Votes.vote_type == -1, 1), else_=0))
+                    ).filter(vote_key.in_(ids)).group_by(vote_key)
+                }
+
+                fixes = []
+                for row_id, positive, negative in rows:
+                    expected = totals.get(row_id, (0, 0))
+                    if (positive, negative) != expected:
+                        fixes.append({
+                            key.key: row_id,
+                            "positive_votes": expected[0],
+                            "negative_votes": expected[1],
+                        })
+                if fixes:
+                    # UPDATE por clave primaria en bloque (executemany)
+                    db.session.execute(update(model), fixes)
+                db.session.commit()
+
+                checked += len(rows)
+                repaired += len(fixes)
+                last_id = ids[-1]
+
+            print(f"{label}: {checked} revisados, {repaired} corregidos")
+
+    """
+    Mide cuantos logins por segundo (verificaciones bcrypt) aguanta este
+    servidor con cada coste, en un solo hilo y con el pool de hashing
+    (PASSWORD_HASH_WORKERS hilos), para dimensionar los workers:
+    $ flask bench-passwords --costs 10,11,12 --seconds 3
+    """
+    @app.cli.command("bench-passwords")
+    @click.option("--costs", default="10,11,12,13", help="Costes bcrypt separados por coma")
+    @click.option("--seconds", default=3.0, help="Duracion de cada medicion")
+    def bench_passwords(costs, seconds):
+        password = "benchmark-password"
+        workers = password_hasher.workers
+        print(f"Coste configurado: {password_hasher.rounds}, hilos del pool: {workers}")
+
+        for cost in [int(c) for c in costs.split(",")]:
+            password_hash = password_hasher.generate_password_hash(password, rounds=cost)
+
+            def run_logins(deadline):
+                done = 0
+                while time.monotonic() < deadline:
+                    password_hasher.check_password_hash(password_hash, password)
+                    done += 1
+                return done
+
+            start = time.monotonic()
+            single = run_logins(start + seconds) / (time.monotonic() - start)
+
+            start = time.monotonic()
+            with ThreadPoolExecutor(max_workers=workers) as clients:
+                results = [clients.submit(run_logins, start + seconds) for _ in range(workers)]
+                total = sum(result.result() for result in results)
+            pooled = total / (time.monotonic() - start)
+
+            print(f"coste {cost}: {single:.1f} logins/s en un hilo, "
+                  f"{pooled:.1f} logins/s con {workers} hilos ({1000 / single:.0f} ms por login)")
+
+    """
+    Precomprime el build del frontend (.gz, y .br si esta instalado brotli)
+    para que el servidor envie esas versiones sin comprimir en cada peticion:
+    $ flask compress-static
+    """
+    @app.cli.command("compress-static")
+    @click.option("--directory", default=None, help="Carpeta a comprimir (por defecto dist/)")
+    def compress_static_command(directory):
+        directory = directory or os.path.join(app.root_path, '..', 'dist')
+        written = compress_static(directory)
+        print(f"{written} archivos comprimidos en {os.path.abspath(directory)}")
+
+    """
+    Recalcula User.unread_notifications desde la tabla notifications (por
+    ejemplo si se borraron notas con notificaciones sin leer), por lotes:
+    $ flask recount-unread-notifications --chunk-size 1000
+    """
+    @app.cli.command("recount-unread-notifications")
+    @click.option("--chunk-size", default=1000, help="Usuarios por lote")
+    def recount_unread_notifications(chunk_size):
+        last_id = 0
+        repaired = 0
+        while True:
+            rows = db.session.query(User.id, User.unread_notifications).filter(
+                User.id > last_id).order_by(User.id).limit(chunk_size).all()
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            totals = dict(db.session.query(Notifications.recipient_user_id, func.count()).filter(
+                Notifications.recipient_user_id.in_(ids),
+                Notifications.is_read.is_(False)
+            ).group_by(Notifications.recipient_user_id).all())
+
+            fixes = [{"id": user_id, "unread_notifications": totals.get(user_id, 0)}
+                     for user_id, unread in rows if unread != totals.get(user_id, 0)]
+            if fixes:
+                db.session.execute(update(User), fixes)
             db.session.commit()
-            print("User: ", user.email, " created.")
+            repaired += len(fixes)
+            last_id = ids[-1]
+
+        print(f"{repaired} contadores corregidos")
+
+    """
+    Decae notes.trending_score (correrlo por cron con el mismo intervalo):
+    $ flask decay-trending --hours 1
+    Con --rebuild lo recalcula desde votos, comentarios y favoritos.
+    """
+    @app.cli.command("decay-trending")
+    @click.option("--hours", default=1.0, help="Horas desde la ultima pasada")
+    @click.option("--rebuild", is_flag=True, help="Recalcular todos los scores")
+    def decay_trending_command(hours, rebuild):
+        if rebuild:
+            print(f"{rebuild_trending()} notas recalculadas")
+        else:
+            print(f"{decay_trending(hours)} notas decaidas")
+
+    """
+    Borra las fotos de perfil (y sus variantes) que ya no usa ningun usuario.
+    Las subidas de la ultima --grace segundos se respetan: el archivo se
+    guarda antes de que el usuario apunte a el:
+    $ flask prune-profile-pictures --grace 3600
+    """
+    @app.cli.command("prune-profile-pictures")
+    @click.option("--grace", default=3600, help="Segundos que se respeta un archivo recien subido")
+    def prune_profile_pictures_command(grace):
+        referenced = {name for (name,) in db.session.query(User.profile_image_url).filter(
+            User.profile_image_url.isnot(None)).distinct()}
+        removed = prune_profile_pictures(referenced, grace=grace)
+        print(f"{len(removed)} fotos borradas")
+
+    """
+    EXPLAIN de las consultas de cada ruta caliente sobre la base actual (con
+    datos de prueba); sale con codigo 1 si alguna recorre una tabla entera:
+    $ flask explain-hot-paths
+    """
+    @app.cli.command("explain-hot-paths")
+    def explain_hot_paths():
+        results = audit_hot_paths(app)
+        if results is None:
+            print("La base no tiene datos: crea usuarios, notas, comentarios y tags primero")
+            raise SystemExit(1)
+
+        failed = False
+        for method, path, status, problems in results:
+            print(f"{'FALLA' if problems else 'ok   '} {method} {path} ({status})")
+            for table, statement in problems:
+                failed = True
+                print(f"        scan secuencial de {table}: {' '.join(statement.split())[:160]}")
+        if failed:
+            raise SystemExit(1)
+
+    """
+    Cuenta las sentencias SQL de listados y detalle con dos tamanos de pagina
+    (ver api/query_plans.py); sale con codigo 1 si alguna ruta hace mas
+    consultas con la pagina grande o no responde 200:
+    $ flask check-query-counts
+    """
+    @app.cli.command("check-query-counts")
+    def check_query_counts():
+        results = count_hot_path_queries(app)
+        if results is None:
+            print("La base no tiene datos: hacen falta notas con comentarios y favoritos")
+            raise SystemExit(1)
+
+        failed = False
+        for method, path, measured in results:
+            (small_status, small), (large_status, large) = measured["small"], measured["large"]
+            ok = small_status == large_status == 200 and large <= small
+            failed = failed or not ok
+            print(f"{'ok   ' if ok else 'FALLA'} {method} {path}: {small} sentencias ({small_status}), "
+                  f"{large} con la pagina grande ({large_status})")
+        if failed:
+            raise SystemExit(1)
+
+    """
+    Recorre las rutas calientes con el detector de N+1 activado (ver
+    api/nplusone.py); sale con codigo 1 si alguna repite cargas o consultas:
+    $ flask check-n-plus-one
+    """
+    @app.cli.command("check-n-plus-one")
+    def check_n_plus_one():
+        results = check_hot_paths(app)
+        if results is None:
+            print("La base no tiene datos: crea usuarios, notas, comentarios y tags primero")
+            raise SystemExit(1)
+
+        failed = False
+        for method, path, status, problems in results:
+            print(f"{'FALLA' if problems else 'ok   '} {method} {path} ({status})")
+            for problem in problems:
+                failed = True
+                print(f"        {nplusone_detector.describe(problem)}")
+        if failed:
+            raise SystemExit(1)
+
+    """
+    Benchmark de carga de las rutas calientes (ver api/benchmark.py). Con
+    --seed-data llena antes una base vacia; imprime el resultado en JSON y, con
+    --baseline, sale con codigo 1 si algo empeora mas de --tolerance. El
+    escenario de votos escribe en la base, asi que cada ejecucion empieza sobre
+    una base vacia recien generada:
+    $ flask bench-api --seed-data --users 500 --notes 20000 --output bench.json
+    $ flask bench-api --seed-data --users 500 --notes 20000 --baseline bench.json
+    """
+    @app.cli.command("bench-api")
+    @click.option("--seed-data", is_flag=True, help="Generar datos sinteticos antes (base vacia)")
+    @click.option("--users", default=200, help="Usuarios a generar")
+    @click.option("--notes", default=2000, help="Notas a generar")
+    @click.option("--tags", default=20, help="Tags a generar")
+    @click.option("--comments", default=5000, help="Comentarios a generar")
+    @click.option("--votes", default=10000, help="Votos a generar")
+    @click.option("--favorites", default=2000, help="Favoritos a generar")
+    @click.option("--seed", default=42, help="Semilla de datos y peticiones")
+    @click.option("--requests", default=200, help="Peticiones por escenario")
+    @click.option("--concurrency", default=8, help="Clientes concurrentes")
+    @click.option("--warmup", default=20, help="Peticiones de calentamiento por escenario")
+    @click.option("--url", default=None, help="Servidor ya arrancado (por defecto, dentro del proceso)")
+    @click.option("--output", default=None, help="Guardar el JSON en este fichero")
+    @click.option("--baseline", default=None, help="JSON de una ejecucion anterior para comparar")
+    @click.option("--tolerance", default=DEFAULT_TOLERANCE, help="Empeoramiento admitido (0.2 = 20%)")
+    def bench_api(seed_data, users, notes, tags, comments, votes, favorites, seed, requests,
+                  concurrency, warmup, url, output, baseline, tolerance):
+        if seed_data:
+            start = time.monotonic()
+            sizes = scaled_sizes(users=users, tags=tags, notes=notes, comments=comments,
+                                 note_votes=votes, favorites=favorites)
+            try:
+                # los mensajes a stderr: stdout es solo el JSON
+                seed_database(sizes, seed=seed, log=lambda line: click.echo(line, err=True))
+            except ValueError as e:
+                click.echo(f"No se puede generar: {e}", err=True)
+                raise SystemExit(1)
+            click.echo(f"Datos generados en {time.monotonic() - start:.1f}s", err=True)
+
+        results = run_benchmark(app, requests=requests, concurrency=concurrency, warmup=warmup,
+                                seed=seed, base_url=url)
+        if results is None:
+            click.echo("La base no tiene datos: usa --seed-data sobre una base vacia", err=True)
+            raise SystemExit(1)
 
-        print("All test users created")
+        report = json.dumps(results, indent=2)
+        print(report)
+        if output:
+            with open(output, "w") as f:
+                f.write(report + "\n")
 
-    @app.cli.command("insert-test-data")
-    def insert_test_data():
-        pass
\ No newline at end of file
+        if baseline:
+            with open(baseline) as f:
+                previous = json.load(f)
+            if baseline_data_differs(results, previous):
+                click.echo("La base no tiene los mismos datos que la linea base: "
+                           "vuelve a generarla con --seed-data sobre una base vacia", err=True)
+                raise SystemExit(1)
+            regressions = compare_to_baseline(results, previous, tolerance)
+            for name, metric, before, after in regressions:
+                click.echo(f"REGRESION {name} {metric}: {before:.2f} -> {after:.2f}", err=True)
+            if regressions:
+                raise SystemExit(1)
@@ -0,0 +1,170 @@
+"""
+Pool de conexiones configurable y metricas del pool.
+
+engine_options() arma SQLALCHEMY_ENGINE_OPTIONS desde el entorno:
+    DB_POOL_PROFILE          default | pgbouncer
+    DB_POOL_SIZE             conexiones fijas por worker (5)
+    DB_MAX_OVERFLOW          conexiones extra temporales (10)
+    DB_POOL_TIMEOUT          segundos esperando una conexion libre (30)
+    DB_POOL_RECYCLE          segundos de vida de una conexion (1800)
+    DB_POOL_PRE_PING         1/0, comprobar la conexion al sacarla (1)
+    DB_STATEMENT_TIMEOUT_MS  statement_timeout de Postgres, 0 = sin limite
+    DB_POOL_SLOW_WAIT_MS     avisa en el log si una espera supera esto (500)
+
+Perfil "pgbouncer" (PgBouncer en modo transaction): el pool ya lo hace
+PgBouncer, asi que por defecto el pool local es pequeno (DB_POOL_SIZE=2,
+DB_MAX_OVERFLOW=0), y el statement_timeout no se manda como parametro de
+arranque (PgBouncer lo rechaza) sino con SET LOCAL al empezar cada
+transaccion, que es lo unico que sobrevive al cambio de conexion de servidor.
+
+TimedQueuePool mide cuanto tarda cada checkout. Si sube la espera y
+checked_out esta al limite, faltan conexiones (workers compitiendo); si la
+espera es baja y las peticiones van lentas, el problema son las consultas.
+"""
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# limites (segundos) del histograma de esperas de checkout
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILES = {
+    "default": {"pool_size": 5, "max_overflow": 10},
+    "pgbouncer": {"pool_size": 2, "max_overflow": 0},
+}
+
+
+class PoolMetrics:
+
+    def __init__(self, slow_wait=0.5):
+        self.slow_wait = slow_wait
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.pool = None
+        # callbacks (segundos, timed_out, pool), p. ej. las metricas de /metrics
+        self.listeners = []
+
+    def observe_wait(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[index] += 1
+        for listener in self.listeners:
+            listener(seconds, timed_out, self.pool)
+        if seconds >= self.slow_wait:
+            logger.warning("Waited %.3fs for a database connection (%s)", seconds,
+                           self.pool.status() if self.pool is not None else "no pool")
+
+    def snapshot(self):
+        pool = self.pool
+        with self._lock:
+            data = {
+                "checkouts_total": self.checkouts,
+                "checkout_timeouts_total": self.timeouts,
+                "checkout_wait_seconds_sum": self.wait_sum,
+                "checkout_wait_seconds_max": self.wait_max,
+                "checkout_wait_buckets": dict(zip(WAIT_BUCKETS, self.wait_buckets)),
+            }
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        return data
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool que mide la espera de cada checkout (incluye abrir una
+    # conexion de overflow). _do_get se llama a si mismo en algunos
+    # reintentos, por eso solo mide la llamada exterior.
+    _timing = threading.local()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool_metrics.pool = self
+
+    def _do_get(self):
+        if getattr(self._timing, "active", False):
+            return super()._do_get()
+        self._timing.active = True
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.observe_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        finally:
+            self._timing.active = False
+        pool_metrics.observe_wait(time.perf_counter() - start)
+        return connection
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def engine_options(database_uri):
+    if database_uri.startswith("sqlite"):
+        # SQLite usa sus propios pools (por hilo/archivo); no hay nada que dimensionar
+        return {}
+
+    profile = os.getenv("DB_POOL_PROFILE", "default")
+    if profile not in PROFILES:
+        raise ValueError(f"DB_POOL_PROFILE must be one of {', '.join(PROFILES)}")
+    defaults = PROFILES[profile]
+    pool_metrics.slow_wait = _env_int("DB_POOL_SLOW_WAIT_MS", 500) / 1000
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": _env_int("DB_POOL_SIZE", defaults["pool_size"]),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", defaults["max_overflow"]),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+
+    statement_timeout = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+    if statement_timeout and profile == "default":
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+
+def init_pool_events(engine):
+    # statement_timeout por transaccion para el perfil pgbouncer
+    statement_timeout = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+    if (engine.dialect.name != "postgresql" or not statement_timeout
+            or os.getenv("DB_POOL_PROFILE", "default") != "pgbouncer"):
+        return
+
+    @event.listens_for(engine, "begin")
+    def set_statement_timeout(connection):
+        # directo al cursor DBAPI: psycopg2 abre la transaccion con esta sentencia
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(f"SET LOCAL statement_timeout = {int(statement_timeout)}")
+        finally:
+            cursor.close()
@@ -0,0 +1,142 @@
+"""
+Hub de eventos en memoria para el stream SSE (/api/events).
+
+Los endpoints de escritura publican en canales ("user:<id>", "note:<id>") y
+cada conexion abierta tiene su propia cola acotada. El stream solo lee de esa
+cola, asi que una conexion abierta no retiene ninguna conexion a la base de
+datos.
+
+- Heartbeat: si no hay eventos en EVENT_STREAM_HEARTBEAT segundos se manda un
+  comentario SSE, que mantiene vivos los proxies y detecta clientes caidos.
+- Backpressure: si un cliente no consume y su cola (EVENT_STREAM_MAX_PENDING)
+  se llena, se le da de baja y recibe un evento "reset"; EventSource reconecta
+  solo y el front vuelve a pedir el estado por la API normal.
+- Limite: como mucho EVENT_STREAM_MAX_CONNECTIONS streams por worker; el
+  resto recibe 503 con Retry-After. Con gthread cada stream abierto ocupa un
+  hilo del worker, asi que por defecto es GUNICORN_THREADS - 4 (lo exporta
+  gunicorn.conf.py) y siempre quedan hilos para el resto de peticiones.
+
+El hub vive en cada proceso: con varios workers de gunicorn, un cliente solo
+recibe lo que se escribe en su mismo worker.
+"""
+import json
+import os
+import queue
+import threading
+
+# hilos que quedan libres para peticiones normales aunque todos los streams esten abiertos
+RESERVED_THREADS = 4
+
+
+def default_max_connections():
+    threads = int(os.getenv('GUNICORN_THREADS', 16))
+    return max(threads - RESERVED_THREADS, 1)
+
+
+class EventHubFull(Exception):
+    pass
+
+
+class Subscription:
+
+    def __init__(self, channels, max_pending):
+        self.channels = channels
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+
+class EventHub:
+
+    def __init__(self, max_connections=None, max_pending=100, heartbeat=15):
+        self.max_connections = max_connections or default_max_connections()
+        self.max_pending = max_pending
+        self.heartbeat = heartbeat
+        self._channels = {}
+        self._connections = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_connections = int(app.config.setdefault(
+            'EVENT_STREAM_MAX_CONNECTIONS', os.getenv('EVENT_STREAM_MAX_CONNECTIONS', self.max_connections)))
+        self.max_pending = int(app.config.setdefault(
+            'EVENT_STREAM_MAX_PENDING', os.getenv('EVENT_STREAM_MAX_PENDING', self.max_pending)))
+        self.heartbeat = float(app.config.setdefault(
+            'EVENT_STREAM_HEARTBEAT', os.getenv('EVENT_STREAM_HEARTBEAT', self.heartbeat)))
+
+    @property
+    def connections(self):
+        return self._connections
+
+    def subscribe(self, channels):
+        subscription = Subscription(frozenset(channels), self.max_pending)
+        with self._lock:
+            if self._connections >= self.max_connections:
+                raise EventHubFull()
+            self._connections += 1
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            removed = False
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers and subscription in subscribers:
+                    subscribers.discard(subscription)
+                    removed = True
+                    if not subscribers:
+                        del self._channels[channel]
+            if removed:
+                self._connections -= 1
+
+    def has_subscribers(self, channel=None):
+        # sin canal: si hay alguien escuchando en este worker
+        if channel is None:
+            return self._connections > 0
+        return channel in self._channels
+
+    def publish(self, channel, event, data):
+        # atajo sin lock para el caso comun (nadie escucha ese canal)
+        if channel not in self._channels:
+            return
+        # la copia con el lock: subscribe/unsubscribe cambian el set desde otros hilos
+        with self._lock:
+            subscribers = tuple(self._channels.get(channel, ()))
+        if not subscribers:
+            return
+        # se serializa una vez por evento, no por suscriptor
+        message = format_event(event, data)
+        overflowed = []
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.overflowed = True
+                overflowed.append(subscription)
+        for subscription in overflowed:
+            self.unsubscribe(subscription)
+
+    def stream(self, subscription):
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if subscription.overflowed:
+                    yield format_event("reset", {"reason": "overflow"})
+                    return
+                try:
+                    message = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                yield message
+        finally:
+            # el cliente cerro la conexion (o se lo dio de baja por overflow)
+            self.unsubscribe(subscription)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+event_hub = EventHub()
@@ -0,0 +1,129 @@
+"""
+Verificacion de los ID tokens de Google con los certificados en cache.
+
+id_token.verify_oauth2_token descarga los certificados de Google en cada
+llamada. Aqui se guardan en memoria el tiempo que indica el Cache-Control
+(max-age) de la respuesta, con una sesion HTTP reutilizable. Cuando caducan,
+una sola peticion los refresca mientras las demas siguen usando la copia
+anterior, y si el refresco falla se sigue usando esa copia hasta stale_ttl,
+sin volver a intentarlo hasta pasados retry_interval segundos (si no, cada
+peticion esperaria su propio timeout contra un servidor caido).
+Si llega un token firmado con un kid que no esta en la copia (Google rota las
+claves antes de que caduque), se vuelven a descargar una vez, como mucho cada
+min_refresh_interval segundos, y se verifica otra vez.
+
+La URL y la sesion se pueden inyectar (GOOGLE_CERTS_URL), por ejemplo para
+apuntar a un servidor de claves local en pruebas.
+"""
+import os
+import re
+import threading
+import time
+
+import requests
+from google.auth import exceptions, jwt
+from requests.adapters import HTTPAdapter
+
+GOOGLE_OAUTH2_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+def pooled_session(pool_size=4):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=1)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class GoogleCertCache:
+
+    def __init__(self, certs_url=GOOGLE_OAUTH2_CERTS_URL, session=None,
+                 default_max_age=300, stale_ttl=86400, timeout=5, clock_skew=10,
+                 min_refresh_interval=60, retry_interval=30):
+        self.certs_url = certs_url
+        self.session = session
+        self.default_max_age = default_max_age
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.clock_skew = clock_skew
+        self.min_refresh_interval = min_refresh_interval
+        self.retry_interval = retry_interval
+        self._certs = None
+        self._expires_at = 0
+        self._fetched_at = None
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.certs_url = app.config.setdefault(
+            'GOOGLE_CERTS_URL', os.getenv('GOOGLE_CERTS_URL', self.certs_url))
+
+    def _fetch(self):
+        if self.session is None:
+            self.session = pooled_session()
+        response = self.session.get(self.certs_url, timeout=self.timeout)
+        response.raise_for_status()
+        match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        return response.json(), max_age
+
+    def _can_refresh(self):
+        # limite para que tokens con kids inventados no fuercen una descarga por peticion
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        fetched_at = self._fetched_at
+        return fetched_at is None or now - fetched_at >= self.min_refresh_interval
+
+    def _usable(self, now, force):
+        # copia vigente, o caducada pero dentro del respiro tras un fallo
+        return (self._certs is not None and (now < self._expires_at or now < self._retry_at)
+                and not (force and self._can_refresh()))
+
+    def get_certs(self, force=False):
+        now = time.monotonic()
+        certs = self._certs
+        if self._usable(now, force):
+            return certs
+
+        # con copia en cache no esperamos a que otro hilo termine de refrescar
+        if not self._lock.acquire(blocking=certs is None):
+            return certs
+        try:
+            if self._usable(time.monotonic(), force):
+                return self._certs
+            try:
+                fetched, max_age = self._fetch()
+            except (requests.RequestException, ValueError) as e:
+                if self._certs is not None and now < self._expires_at + self.stale_ttl:
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    return self._certs
+                raise exceptions.TransportError(f"No se pudieron obtener los certificados de Google: {e}")
+            self._certs = fetched
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + max_age
+            return fetched
+        finally:
+            self._lock.release()
+
+    def verify_oauth2_token(self, token, audience):
+        # equivalente a google.oauth2.id_token.verify_oauth2_token, con certificados cacheados
+        certs = self.get_certs()
+        try:
+            kid = jwt.decode_header(token).get('kid')
+        except (ValueError, TypeError):
+            kid = None  # token mal formado: que lo rechace jwt.decode
+        if kid is not None and kid not in certs:
+            certs = self.get_certs(force=True)
+        idinfo = jwt.decode(token, certs=certs, audience=audience,
+                            clock_skew_in_seconds=self.clock_skew)
+        if idinfo.get('iss') not in GOOGLE_ISSUERS:
+            raise exceptions.GoogleAuthError(
+                f"Wrong issuer. 'iss' should be one of {GOOGLE_ISSUERS} but is {idinfo.get('iss')}")
+        return idinfo
+
+
+google_certs = GoogleCertCache()
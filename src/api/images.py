@@ -0,0 +1,338 @@
+"""
+Profile picture storage.
+
+Uploads are copied to disk in chunks with a hard byte limit, their type is
+detected from the first bytes (not from the extension), and they are stored
+under the SHA-256 of their content, so the same image uploaded twice is kept
+once and a given URL never changes content (clients can cache it forever).
+
+Because a file can be shared by several users, removing a picture only
+clears the user's reference; prune_profile_pictures() (flask
+prune-profile-pictures) later deletes the files nobody points to.
+
+Re-encoding into the normalized sizes (compact WebP) happens in a background
+worker after the request returns. Other widths requested with ?w= are
+generated once into a bounded on-disk LRU cache (VariantCache). Pillow is
+optional: without it the original file is still stored and served.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Same folder the upload endpoint has always used
+PROFILE_PICTURES_FOLDER = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'src', 'front', 'assets', 'img', 'ProfilePictures')
+
+MAX_PROFILE_PICTURE_BYTES = int(os.getenv('MAX_PROFILE_PICTURE_BYTES', 5 * 1024 * 1024))
+NORMALIZED_SIZES = (512, 128)
+# ?w= is rounded up to one of these so the number of variants stays bounded
+VARIANT_WIDTHS = (32, 64, 128, 256, 512)
+VARIANT_CACHE_FOLDER = os.getenv(
+    'PROFILE_PICTURE_CACHE_DIR', os.path.join(PROFILE_PICTURES_FOLDER, '.cache'))
+VARIANT_CACHE_MAX_BYTES = int(os.getenv('PROFILE_PICTURE_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Let the front server send the bytes: "x-accel" (nginx X-Accel-Redirect, with
+# an internal location for ACCEL_PREFIX pointing at PROFILE_PICTURES_FOLDER) or
+# "x-sendfile" (Apache/lighttpd). Empty means Flask streams the file itself.
+SENDFILE_MODE = os.getenv('PROFILE_PICTURE_SENDFILE', '')
+ACCEL_PREFIX = os.getenv('PROFILE_PICTURE_ACCEL_PREFIX', '/protected/profile-pictures/')
+
+
+def _default_cache_accel_prefix():
+    # The default cache folder lives inside PROFILE_PICTURES_FOLDER and is
+    # reachable through ACCEL_PREFIX; a cache elsewhere needs its own internal
+    # nginx location
+    relative = os.path.relpath(VARIANT_CACHE_FOLDER, PROFILE_PICTURES_FOLDER)
+    if relative == os.curdir or relative.startswith(os.pardir):
+        return '/protected/profile-picture-cache/'
+    return ACCEL_PREFIX + relative.replace(os.sep, '/') + '/'
+
+
+CACHE_ACCEL_PREFIX = os.getenv('PROFILE_PICTURE_CACHE_ACCEL_PREFIX') or _default_cache_accel_prefix()
+CHUNK_SIZE = 64 * 1024
+
+# Refuse to decode absurdly large images (decompression bombs)
+MAX_IMAGE_PIXELS = 40_000_000
+
+_MAGIC_BYTES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+)
+
+image_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-worker')
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsupportedImage(Exception):
+    pass
+
+
+def sniff_image_type(head):
+    for magic, extension in _MAGIC_BYTES:
+        if head.startswith(magic):
+            return extension
+    return None
+
+
+_SAFE_FILENAME_RE = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*$')
+_CONTENT_ADDRESSED_RE = re.compile(r'^([0-9a-f]{32})\.(png|jpg)$')
+
+
+def variant_filename(filename, size):
+    # "<digest>.png" -> "<digest>_128.webp"
+    return f"{filename.rsplit('.', 1)[0]}_{size}.webp"
+
+
+def is_content_addressed(filename):
+    return bool(_CONTENT_ADDRESSED_RE.match(filename))
+
+
+def is_safe_filename(filename):
+    return bool(_SAFE_FILENAME_RE.match(filename)) and '..' not in filename
+
+
+def picture_etag(filename, width=None):
+    # Content-addressed names already are a hash of the bytes; older uploads
+    # (user_<id>_<timestamp>.ext) never change either, so the name works too
+    match = _CONTENT_ADDRESSED_RE.match(filename)
+    base = match.group(1) if match else hashlib.sha1(filename.encode('utf-8')).hexdigest()[:32]
+    return f"{base}-w{width}" if width else base
+
+
+def accel_path(folder, name):
+    # X-Accel-Redirect target for a file in the pictures folder or the variant cache
+    if os.path.abspath(folder) == os.path.abspath(PROFILE_PICTURES_FOLDER):
+        return ACCEL_PREFIX + name
+    return CACHE_ACCEL_PREFIX + name
+
+
+def variant_width(requested):
+    for width in VARIANT_WIDTHS:
+        if requested <= width:
+            return width
+    return None
+
+
+def store_profile_picture(stream, folder=PROFILE_PICTURES_FOLDER, max_bytes=MAX_PROFILE_PICTURE_BYTES):
+    """
+    Copies the upload to disk and returns (filename, created). The filename is
+    content-addressed; created is False when the same image already existed.
+    """
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if extension is None:
+                    extension = sniff_image_type(chunk)
+                    if extension is None:
+                        raise UnsupportedImage()
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+        if extension is None:
+            raise UnsupportedImage()
+
+        filename = f"{digest.hexdigest()[:32]}.{extension}"
+        final_path = os.path.join(folder, filename)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+            # fresh mtime: the pruner leaves it alone until the user row points to it
+            os.utime(final_path)
+            return filename, False
+        os.replace(tmp_path, final_path)
+        return filename, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def prune_profile_pictures(referenced, folder=PROFILE_PICTURES_FOLDER, grace=3600, now=None):
+    """
+    Deletes content-addressed pictures (and their variants) that are not in
+    referenced. Files touched in the last grace seconds are kept: an upload
+    stores the file before its user row is committed.
+    """
+    now = now if now is not None else time.time()
+    removed = []
+    for name in os.listdir(folder) if os.path.isdir(folder) else []:
+        if not is_content_addressed(name) or name in referenced:
+            continue
+        path = os.path.join(folder, name)
+        try:
+            if now - os.path.getmtime(path) < grace:
+                continue
+            for variant in [variant_filename(name, size) for size in NORMALIZED_SIZES]:
+                variant_path = os.path.join(folder, variant)
+                if os.path.exists(variant_path):
+                    os.remove(variant_path)
+            os.remove(path)
+        except OSError:
+            logger.warning("Could not prune profile picture %s", name, exc_info=True)
+            continue
+        variant_cache.discard(name)
+        removed.append(name)
+    return removed
+
+
+def process_profile_picture(filename, folder=PROFILE_PICTURES_FOLDER):
+    # Writes the normalized WebP variants next to the original
+    if Image is None:
+        return
+    try:
+        for size in NORMALIZED_SIZES:
+            target = os.path.join(folder, variant_filename(filename, size))
+            if not os.path.exists(target):
+                _resize_to_webp(os.path.join(folder, filename), target, size)
+    except Exception:
+        logger.exception("Could not process profile picture %s", filename)
+
+
+def schedule_profile_picture_processing(filename, folder=PROFILE_PICTURES_FOLDER):
+    return image_worker.submit(process_profile_picture, filename, folder)
+
+
+def _resize_to_webp(source_path, target_path, width):
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        image.thumbnail((width, width), Image.LANCZOS)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), prefix='.variant-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                image.save(out, format='WEBP', quality=80, method=4)
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class VariantCache:
+    """
+    Resized variants on disk with an in-memory LRU index, so a hit costs no
+    filesystem lookups of its own. The index is rebuilt from the folder (by
+    mtime) the first time it is used; when the total size goes over max_bytes
+    the least recently served variants are deleted.
+    """
+
+    def __init__(self, folder=VARIANT_CACHE_FOLDER, source_folder=PROFILE_PICTURES_FOLDER,
+                 max_bytes=VARIANT_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.source_folder = source_folder
+        self.max_bytes = max_bytes
+        self._index = None
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        os.makedirs(self.folder, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._index = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._total = sum(self._index.values())
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+
+    def forget(self, name):
+        # another worker may have evicted the file
+        with self._lock:
+            size = self._index.pop(name, None) if self._index is not None else None
+            if size is not None:
+                self._total -= size
+
+    def discard(self, filename):
+        # removes every cached width of a picture (e.g. when it is deleted)
+        for width in VARIANT_WIDTHS:
+            name = variant_filename(filename, width)
+            self.forget(name)
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+
+    def get(self, filename, width):
+        """
+        Returns the variant file name inside self.folder, generating it if
+        needed. Raises FileNotFoundError if the original does not exist.
+        """
+        name = variant_filename(filename, width)
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            if name in self._index:
+                self._index.move_to_end(name)
+                return name
+
+        # The normalized 512px variant is a much cheaper source than the original
+        source = os.path.join(self.source_folder, variant_filename(filename, 512))
+        if width > 512 or not os.path.exists(source):
+            source = os.path.join(self.source_folder, filename)
+        target = os.path.join(self.folder, name)
+        _resize_to_webp(source, target, width)
+        size = os.path.getsize(target)
+
+        with self._lock:
+            if name not in self._index:
+                self._index[name] = size
+                self._total += size
+            self._index.move_to_end(name)
+            self._evict()
+        return name
+
+
+variant_cache = VariantCache()
+
+
+def resolve_profile_picture(filename, requested_width=None):
+    """
+    Returns (folder, name, etag) of the file to serve for a picture and an
+    optional requested width. Widths are rounded up to VARIANT_WIDTHS; larger
+    widths, or no Pillow, get the original.
+    """
+    width = variant_width(requested_width) if requested_width else None
+    if width is not None and Image is not None:
+        try:
+            return variant_cache.folder, variant_cache.get(filename, width), picture_etag(filename, width)
+        except FileNotFoundError:
+            raise
+        except Exception:
+            logger.exception("Could not resize profile picture %s", filename)
+    return PROFILE_PICTURES_FOLDER, filename, picture_etag(filename)
@@ -0,0 +1,182 @@
+"""
+Metricas en formato Prometheus (GET /metrics).
+
+Por ruta (la regla de Flask, p. ej. /api/notes/<int:note_id>) y status:
+- http_request_duration_seconds      histograma de latencia
+- http_response_size_bytes           histograma del tamano de la respuesta
+- http_requests_in_progress          peticiones en curso (gauge)
+- db_statements_per_request          sentencias SQL por peticion
+- db_time_per_request_seconds        tiempo en la base de datos por peticion
+Y del pool de conexiones (api/db_pool.py): espera de checkout, conexiones en
+uso y overflow.
+
+Con gunicorn cada worker tiene sus propios contadores: si existe
+PROMETHEUS_MULTIPROC_DIR, prometheus_client los escribe en ficheros mmap de ese
+directorio y /metrics los suma todos (gunicorn.conf.py lo prepara y limpia los
+de los workers muertos). /metrics y /api/metrics/db-pool piden
+"Authorization: Bearer <METRICS_TOKEN>"; sin METRICS_TOKEN solo quedan abiertos
+en desarrollo (FLASK_DEBUG=1) y en produccion responden 401.
+
+prometheus_client es opcional: sin el, /metrics responde 503 y no se mide nada.
+"""
+import hmac
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+from api.db_pool import pool_metrics, TimedQueuePool
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge,
+                                   Histogram, REGISTRY, generate_latest, multiprocess)
+except ImportError:  # pragma: no cover - prometheus_client is optional
+    Histogram = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# rutas que no se miden (el propio scrape)
+SKIP_PATHS = {"/metrics"}
+
+
+class Metrics:
+
+    def __init__(self):
+        self.enabled = False
+        self.token = None
+        self.open_without_token = False
+
+    def init_app(self, app, engine):
+        if Histogram is None:
+            app.logger.warning("prometheus_client is not installed, /metrics is disabled")
+        else:
+            self._create_metrics()
+            self.enabled = True
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+            app.teardown_request(self._teardown_request)
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+            pool_metrics.listeners.append(self._observe_pool)
+            event.listen(TimedQueuePool, "checkin", self._pool_checkin)
+        self.token = app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+        self.open_without_token = app.debug or os.getenv("FLASK_DEBUG") == "1"
+        if not self.token and not self.open_without_token:
+            app.logger.warning("METRICS_TOKEN is not set, /metrics will answer 401")
+        app.add_url_rule('/metrics', 'metrics', self.render)
+
+    def _create_metrics(self):
+        labels = ("method", "route", "status")
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Request latency", labels, buckets=LATENCY_BUCKETS)
+        self.response_size = Histogram(
+            "http_response_size_bytes", "Response body size", labels, buckets=SIZE_BUCKETS)
+        self.in_progress = Gauge(
+            "http_requests_in_progress", "Requests being served", ("method", "route"),
+            multiprocess_mode="livesum")
+        self.statements = Histogram(
+            "db_statements_per_request", "SQL statements per request", labels,
+            buckets=STATEMENT_BUCKETS)
+        self.db_time = Histogram(
+            "db_time_per_request_seconds", "Time spent in SQL per request", labels,
+            buckets=LATENCY_BUCKETS)
+        self.statements_total = Counter(
+            "db_statements_total", "SQL statements executed", ("route",))
+        self.pool_wait = Histogram(
+            "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection",
+            buckets=POOL_WAIT_BUCKETS)
+        self.pool_timeouts = Counter(
+            "db_pool_checkout_timeouts_total", "Checkouts that hit pool_timeout")
+        self.pool_checked_out = Gauge(
+            "db_pool_checked_out", "Connections checked out", multiprocess_mode="livesum")
+        self.pool_overflow = Gauge(
+            "db_pool_overflow", "Overflow connections open", multiprocess_mode="livesum")
+
+    @staticmethod
+    def _route():
+        # la regla y no la URL, para no crear una serie por id
+        return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+    def _before_request(self):
+        if request.path in SKIP_PATHS:
+            return
+        g.metrics_start = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_db_time = 0.0
+        g.metrics_route = self._route()
+        self.in_progress.labels(request.method, g.metrics_route).inc()
+
+    def _after_request(self, response):
+        if "metrics_start" in g:
+            self._observe(response.status_code, response)
+        return response
+
+    def _teardown_request(self, exc):
+        if "metrics_start" not in g:
+            return
+        if exc is not None and not g.get("metrics_observed"):
+            self._observe(500, None)
+        self.in_progress.labels(request.method, g.metrics_route).dec()
+
+    def _observe(self, status, response):
+        g.metrics_observed = True
+        labels = (request.method, g.metrics_route, str(status))
+        self.request_duration.labels(*labels).observe(time.perf_counter() - g.metrics_start)
+        self.statements.labels(*labels).observe(g.metrics_statements)
+        self.db_time.labels(*labels).observe(g.metrics_db_time)
+        if g.metrics_statements:
+            self.statements_total.labels(g.metrics_route).inc(g.metrics_statements)
+        # los streams (SSE, ficheros) no tienen longitud conocida
+        if response is not None and not response.is_streamed and response.content_length is not None:
+            self.response_size.labels(*labels).observe(response.content_length)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and "metrics_start" in g:
+            conn.info["metrics_query_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("metrics_query_start", None)
+        if start is not None and has_request_context() and "metrics_start" in g:
+            g.metrics_db_time += time.perf_counter() - start
+            g.metrics_statements += 1
+
+    def _observe_pool(self, seconds, timed_out, pool):
+        if timed_out:
+            self.pool_timeouts.inc()
+        else:
+            self.pool_wait.observe(seconds)
+        self._set_pool_gauges(pool)
+
+    def _pool_checkin(self, dbapi_connection, connection_record):
+        if pool_metrics.pool is not None:
+            self._set_pool_gauges(pool_metrics.pool)
+
+    def _set_pool_gauges(self, pool):
+        self.pool_checked_out.set(pool.checkedout())
+        self.pool_overflow.set(max(pool.overflow(), 0))
+
+    def authorized(self):
+        if not self.token:
+            return self.open_without_token
+        # en bytes: compare_digest con str falla (TypeError) si hay caracteres no ASCII
+        return hmac.compare_digest(request.headers.get("Authorization", "").encode("utf-8"),
+                                   f"Bearer {self.token}".encode("utf-8"))
+
+    def render(self):
+        if not self.enabled:
+            return Response("prometheus_client is not installed\n", status=503, mimetype="text/plain")
+        if not self.authorized():
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+metrics = Metrics()
@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Integer, String, Boolean, DateTime, Text, ForeignKey, func, Table
+from sqlalchemy.orm import Mapped, mapped_column, validates
+from sqlalchemy import Integer, String, Boolean, DateTime, Text, Float, ForeignKey, func, Table
 import datetime
+import unicodedata
 
 db = SQLAlchemy()
 
@@ -27,10 +28,14 @@ class User(db.Model):
     last_login_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, nullable=False, server_default=func.now())
+    # Contador de notificaciones sin leer, lo mantienen el fan-out y mark-read
+    unread_notifications: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0")
     notes = db.relationship("Notes", backref="user")
     comments = db.relationship("Comments", backref="user")
     reports = db.relationship("Reports", backref="reporter")
-    notifications = db.relationship("Notifications", backref="recipient")
+    notifications = db.relationship(
+        "Notifications", backref="recipient", foreign_keys="Notifications.recipient_user_id")
     favorite_notes = db.relationship("UserNoteFavorites", backref="user")
     votes = db.relationship("Votes", backref="user")
 
@@ -51,7 +56,9 @@ note_tags = Table('note_tags', db.Model.metadata,
                   db.Column('note_id', Integer, ForeignKey(
                       'notes.note_id'), primary_key=True),
                   db.Column('tag_id', Integer, ForeignKey(
-                      'tags.tag_id'), primary_key=True)
+                      'tags.tag_id'), primary_key=True),
+                  # la PK empieza por note_id; las busquedas por tag van por aqui
+                  db.Index('ix_note_tags_tag_id', 'tag_id', 'note_id')
                   )
 
 
@@ -65,7 +72,23 @@ class Notes(db.Model):
         DateTime, default=datetime.datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.datetime.utcnow)
+    # Contadores desnormalizados, los mantiene create_vote en la misma transaccion
+    # (se reparan con `flask recount-votes`)
+    positive_votes: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0")
+    negative_votes: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0")
+    # Score con decaimiento para /api/notes/trending (ver api/trending.py)
+    trending_score: Mapped[float] = mapped_column(
+        Float, nullable=False, default=0.0, server_default="0")
     tags = db.relationship("Tags", secondary=note_tags, backref="notes")
+
+    __table_args__ = (
+        db.Index('ix_notes_trending_score', 'trending_score', 'note_id'),
+        # keyset del feed (created_at, note_id) y notas de un usuario
+        db.Index('ix_notes_created_at', 'created_at', 'note_id'),
+        db.Index('ix_notes_user_id', 'user_id', 'created_at'),
+    )
     reports = db.relationship(
         "Reports", backref="note", cascade="all, delete-orphan")
     notifications = db.relationship(
@@ -81,10 +104,6 @@ class Notes(db.Model):
     )
 
     def serialize(self):
-        # Obtener contadores de votos - CORREGIDO (sin import circular)
-        positive_votes = sum(1 for vote in self.votes if vote.vote_type == 1)
-        negative_votes = sum(1 for vote in self.votes if vote.vote_type == -1)
-        
         # Esta es la parte que valida si la nota es anónima o no
         user_info = None
         if not self.is_anonymous:
@@ -110,11 +129,45 @@ class Notes(db.Model):
             "favorited_by": [fav.serialize() for fav in self.favorited_by],
             "votes": [vote.serialize() for vote in self.votes],
             "user_info": user_info,
-            "positive_votes": positive_votes,
-            "negative_votes": negative_votes,
+            "positive_votes": self.positive_votes,
+            "negative_votes": self.negative_votes,
             "comments_count": len(self.comments)
         }
 
+    def serialize_card(self, counts=None):
+        # Version reducida para listados: solo contadores, nombres de tags y autor,
+        # sin los arrays anidados de comments, votes, reports y favorited_by
+        if counts is None:
+            counts = {
+                "comments_count": len(self.comments),
+                "favorites_count": len(self.favorited_by),
+            }
+
+        user_info = None
+        if not self.is_anonymous:
+            user_info = {
+                "id": self.user.id,
+                "username": self.user.username,
+                "first_name": self.user.first_name,
+                "last_name": self.user.last_name,
+            }
+
+        return {
+            "note_id": self.note_id,
+            "user_id": self.user_id,
+            "title": self.title,
+            "content": self.content,
+            "is_anonymous": self.is_anonymous,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "tags": [tag.name for tag in self.tags],
+            "user_info": user_info,
+            "positive_votes": self.positive_votes,
+            "negative_votes": self.negative_votes,
+            "comments_count": counts.get("comments_count", 0),
+            "favorites_count": counts.get("favorites_count", 0)
+        }
+
 class Comments (db.Model):
     comment_id: Mapped[int] = mapped_column(primary_key=True)
     note_id: Mapped[int] = mapped_column(
@@ -125,6 +178,10 @@ class Comments (db.Model):
         DateTime, default=datetime.datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    positive_votes: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0")
+    negative_votes: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0")
     reports = db.relationship(
         "Reports", backref="comment", cascade="all, delete-orphan")
     notifications = db.relationship(
@@ -132,6 +189,10 @@ class Comments (db.Model):
     votes = db.relationship("Votes", backref="comment",
                             cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_comments_note_id', 'note_id', 'created_at'),
+    )
+
     def serialize(self):
         return {
             "comment_id": self.comment_id,
@@ -141,14 +202,34 @@ class Comments (db.Model):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "username": self.user.username if self.user else "Usuario eliminado",
             "first_name": self.user.first_name if self.user else "",
-            "last_name": self.user.last_name if self.user else ""
+            "last_name": self.user.last_name if self.user else "",
+            "positive_votes": self.positive_votes,
+            "negative_votes": self.negative_votes
         }
 
 
+def normalize_tag_name(name):
+    # minusculas y sin tildes: "Salud Mental" y "salud mental" comparten prefijo
+    decomposed = unicodedata.normalize('NFKD', (name or '').strip().lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
 class Tags(db.Model):
     tag_id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     color_hex: Mapped[str] = mapped_column(String(7), nullable=True)
+    # nombre normalizado para busquedas por prefijo (autocompletar)
+    name_normalized: Mapped[str] = mapped_column(String(50), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_tags_name_normalized', 'name_normalized',
+                 postgresql_ops={'name_normalized': 'text_pattern_ops'}),
+    )
+
+    @validates('name')
+    def _sync_name_normalized(self, key, value):
+        self.name_normalized = normalize_tag_name(value)
+        return value
 
     def serialize(self):
         return {
@@ -172,6 +253,23 @@ class Reports(db.Model):
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, nullable=False, server_default=func.now())
 
+    __table_args__ = (
+        # se cargan por nota/comentario (serialize y borrado en cascada)
+        db.Index('ix_reports_note_id', 'note_id'),
+        db.Index('ix_reports_comment_id', 'comment_id'),
+    )
+
+    def serialize(self):
+        return {
+            "report_id": self.report_id,
+            "note_id": self.note_id,
+            "comment_id": self.comment_id,
+            "reporter_user_id": self.reporter_user_id,
+            "reason": self.reason,
+            "status": self.status,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
 
 class Notifications(db.Model):
     notification_id: Mapped[int] = mapped_column(primary_key=True)
@@ -186,6 +284,36 @@ class Notifications(db.Model):
         Boolean, nullable=False, default=False)
     created_at: Mapped[datetime.datetime] = mapped_column(
         DateTime, nullable=False, server_default=func.now())
+    # 'comment', 'note_vote' o 'comment_vote'
+    kind: Mapped[str] = mapped_column(
+        String(20), nullable=False, default='comment', server_default='comment')
+    # quien comento o voto
+    actor_user_id: Mapped[int] = mapped_column(
+        ForeignKey("user.id"), nullable=True)
+    actor = db.relationship("User", foreign_keys=[actor_user_id])
+
+    __table_args__ = (
+        # listado por usuario (keyset por id) y no leidas del usuario
+        db.Index('ix_notifications_recipient', 'recipient_user_id', 'notification_id'),
+        db.Index('ix_notifications_recipient_unread', 'recipient_user_id', 'is_read'),
+        # borrado en cascada de una nota o un comentario
+        db.Index('ix_notifications_note_id', 'note_id'),
+        db.Index('ix_notifications_comment_id', 'comment_id'),
+    )
+
+    def serialize(self):
+        return {
+            "notification_id": self.notification_id,
+            "kind": self.kind,
+            "note_id": self.note_id,
+            "comment_id": self.comment_id,
+            "is_read": self.is_read,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "actor": {
+                "id": self.actor.id,
+                "username": self.actor.username,
+            } if self.actor else None
+        }
 
 
 class UserNoteFavorites(db.Model):
@@ -194,8 +322,18 @@ class UserNoteFavorites(db.Model):
         ForeignKey("user.id"), primary_key=True)
     note_id: Mapped[int] = mapped_column(
         ForeignKey("notes.note_id"), primary_key=True)
+    # default en Python ademas del server_default: el keyset de get_favorites
+    # compara con el valor del cursor y en SQLite CURRENT_TIMESTAMP se guarda
+    # sin microsegundos (y se compara como texto)
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, nullable=False, server_default=func.now())
+        DateTime, nullable=False, default=datetime.datetime.utcnow, server_default=func.now())
+
+    __table_args__ = (
+        # la PK (user_id, note_id) no sirve para ordenar por fecha ni para
+        # contar los favoritos de una nota
+        db.Index('ix_user_note_favorites_user_created', 'user_id', 'created_at', 'note_id'),
+        db.Index('ix_user_note_favorites_note_id', 'note_id'),
+    )
     
     def serialize(self):
         return {
@@ -216,7 +354,18 @@ class Votes(db.Model):
         ForeignKey("comments.comment_id"), nullable=True)
     # 1 para voto positivo, -1 para negativo
     vote_type: Mapped[int] = mapped_column(Integer, nullable=False)
-    
+    # solo se rellena cuando el voto cambia de tipo (NULL = recien creado)
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)
+
+    # un voto por usuario y nota/comentario; tambien es el objetivo del upsert
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'note_id', name='uq_votes_user_note'),
+        db.UniqueConstraint('user_id', 'comment_id', name='uq_votes_user_comment'),
+        # recuento de votos por nota/comentario y borrados en cascada
+        db.Index('ix_votes_note_id_vote_type', 'note_id', 'vote_type'),
+        db.Index('ix_votes_comment_id_vote_type', 'comment_id', 'vote_type'),
+    )
+
     def serialize(self):
         return {
             "vote_id": self.vote_id,
@@ -0,0 +1,172 @@
+"""
+Fan-out de notificaciones.
+
+create_comment y create_vote solo encolan un evento en memoria (publish), asi
+que no suman ninguna consulta a la peticion. Un hilo en segundo plano junta
+los eventos en lotes (hasta batch_size o flush_interval segundos), resuelve
+los destinatarios con una consulta IN por lote, inserta las notificaciones con
+executemany y sube el contador User.unread_notifications de cada destinatario
+en la misma transaccion. Despues avisa a cada destinatario por el hub de
+eventos (stream SSE).
+
+Con NOTIFICATIONS_SYNC=1 los eventos se escriben en el momento (util en
+pruebas y en la consola).
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import bindparam, insert, update
+
+from api.models import db, User, Notes, Comments, Notifications
+from api.events import event_hub
+
+logger = logging.getLogger(__name__)
+
+user_table = User.__table__
+
+
+class NotificationFanout:
+
+    def __init__(self, batch_size=200, flush_interval=0.5, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.sync = False
+        self.app = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.sync = bool(app.config.setdefault(
+            'NOTIFICATIONS_SYNC', os.getenv('NOTIFICATIONS_SYNC') == '1'))
+        atexit.register(self.flush)
+
+    def publish(self, kind, actor_user_id, note_id=None, comment_id=None):
+        event = {
+            "kind": kind,
+            "actor_user_id": int(actor_user_id),
+            "note_id": note_id,
+            "comment_id": comment_id,
+        }
+        if self.sync:
+            self._process([event])
+            return
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            logger.warning("Notification queue full, dropping %s event", kind)
+
+    def flush(self):
+        # escribe en el momento lo que quede en cola (al salir, en pruebas...)
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._process(batch)
+
+    def _ensure_worker(self):
+        # un hilo por proceso: tras el fork de gunicorn hay que arrancar otro
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name='notification-fanout', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        with self.app.app_context():
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Could not write %d notification events", len(batch))
+                db.session.rollback()
+            finally:
+                if not self.sync:
+                    db.session.remove()
+
+    def _write(self, events):
+        note_ids = {e["note_id"] for e in events if e["note_id"] and e["kind"] != 'comment_vote'}
+        comment_ids = {e["comment_id"] for e in events if e["kind"] == 'comment_vote'}
+
+        # destinatarios de todo el lote con una consulta por tabla
+        note_owners = dict(db.session.query(Notes.note_id, Notes.user_id).filter(
+            Notes.note_id.in_(note_ids))) if note_ids else {}
+        comment_owners = {
+            comment_id: (user_id, note_id)
+            for comment_id, user_id, note_id in db.session.query(
+                Comments.comment_id, Comments.user_id, Comments.note_id
+            ).filter(Comments.comment_id.in_(comment_ids))
+        } if comment_ids else {}
+
+        rows = []
+        for event in events:
+            note_id = event["note_id"]
+            if event["kind"] == 'comment_vote':
+                owner = comment_owners.get(event["comment_id"])
+                recipient, note_id = owner if owner else (None, None)
+            else:
+                recipient = note_owners.get(note_id)
+            # la nota o el comentario ya no existe, o te notificarias a ti mismo
+            if recipient is None or recipient == event["actor_user_id"]:
+                continue
+            rows.append({
+                "recipient_user_id": recipient,
+                "actor_user_id": event["actor_user_id"],
+                "note_id": note_id,
+                "comment_id": event["comment_id"],
+                "kind": event["kind"],
+                "is_read": False,
+            })
+        if not rows:
+            return rows
+
+        unread = {}
+        for row in rows:
+            unread[row["recipient_user_id"]] = unread.get(row["recipient_user_id"], 0) + 1
+
+        db.session.execute(insert(Notifications), rows)
+        db.session.execute(
+            update(user_table).where(user_table.c.id == bindparam('recipient')).values(
+                unread_notifications=user_table.c.unread_notifications + bindparam('added')),
+            [{"recipient": recipient, "added": added} for recipient, added in unread.items()]
+        )
+        db.session.commit()
+
+        for recipient, added in unread.items():
+            event_hub.publish(f"user:{recipient}", "notifications", {
+                "notifications": [
+                    {key: row[key] for key in ("kind", "actor_user_id", "note_id", "comment_id")}
+                    for row in rows if row["recipient_user_id"] == recipient
+                ],
+                "unread_added": added
+            })
+        return rows
+
+
+notification_fanout = NotificationFanout()
@@ -0,0 +1,179 @@
+"""
+Detector de consultas N+1 para desarrollo y CI.
+
+NPLUSONE_MODE = off (por defecto) | log | raise
+NPLUSONE_THRESHOLD = 3
+
+Dentro de cada peticion cuenta:
+- las cargas lazy de cada relacion (evento do_orm_execute con
+  is_relationship_load): Notes.user cargada 20 veces en un GET /api/notes es
+  el N+1 tipico de un serialize dentro de un bucle.
+- las SELECT con el mismo texto (misma forma, otros parametros) que no vienen
+  de una relacion, p. ej. un Model.query.get() dentro de un bucle.
+Lo que llegue a NPLUSONE_THRESHOLD se reporta al final de la peticion con la
+pila de llamadas dentro de src/api (ruta > serialize > ...) de la primera vez.
+En modo log va al log como warning; en modo raise lanza NPlusOneError y la
+peticion termina en 500, para que una regresion rompa los tests.
+
+Con NPLUSONE_MODE=off no se registra ningun listener. El comando
+    $ flask check-n-plus-one
+recorre las rutas calientes de api/query_plans.py con el detector activado y
+sale con codigo 1 si encuentra algo.
+"""
+import logging
+import os
+import sys
+import threading
+
+from flask import g, has_request_context, request
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from api.cache import response_cache
+from api.query_plans import HOT_PATHS, fill_path, sample_ids
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "log", "raise")
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class NPlusOneDetector:
+
+    def __init__(self, threshold=3):
+        self.mode = "off"
+        self.threshold = threshold
+        self.engine = None
+        self._listening = False
+        # lista donde check_hot_paths recoge los problemas de cada peticion
+        self.collected = None
+        self._lock = threading.Lock()
+        self._source_root = os.path.dirname(os.path.abspath(__file__))
+
+    def init_app(self, app, engine):
+        mode = app.config.setdefault('NPLUSONE_MODE', os.getenv('NPLUSONE_MODE', 'off'))
+        if mode not in MODES:
+            raise ValueError(f"NPLUSONE_MODE must be one of {', '.join(MODES)}")
+        self.threshold = int(app.config.setdefault(
+            'NPLUSONE_THRESHOLD', os.getenv('NPLUSONE_THRESHOLD', self.threshold)))
+        self.engine = engine
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if mode != "off":
+            self.enable(mode)
+
+    def enable(self, mode="log"):
+        self.mode = mode
+        with self._lock:
+            if not self._listening:
+                event.listen(Session, "do_orm_execute", self._do_orm_execute)
+                event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+                self._listening = True
+
+    def _before_request(self):
+        if self.mode != "off":
+            g.nplusone = {"relationships": {}, "statements": {}, "lazy_pending": False}
+
+    def _after_request(self, response):
+        if "nplusone" not in g:
+            return response
+        problems = self.problems()
+        if self.collected is not None:
+            self.collected.append(problems)
+            return response
+        if not problems:
+            return response
+        message = f"{request.method} {request.path}: " + "; ".join(
+            self.describe(problem) for problem in problems)
+        if self.mode == "raise":
+            raise NPlusOneError(message)
+        logger.warning("N+1 queries in %s", message)
+        return response
+
+    def problems(self):
+        """Las relaciones y consultas repetidas de la peticion actual que pasan del umbral."""
+        found = []
+        for name, (count, stack) in g.nplusone["relationships"].items():
+            if count >= self.threshold:
+                found.append({"relationship": name, "sql": None, "count": count, "stack": stack})
+        for statement, (count, stack) in g.nplusone["statements"].items():
+            if count >= self.threshold:
+                found.append({"relationship": None, "sql": statement, "count": count, "stack": stack})
+        return found
+
+    @staticmethod
+    def describe(problem):
+        if problem["relationship"]:
+            what = f"lazy load of {problem['relationship']}"
+        else:
+            what = f"query {' '.join(problem['sql'].split())[:120]!r}"
+        return f"{what} x{problem['count']} at {' > '.join(problem['stack']) or '?'}"
+
+    def _do_orm_execute(self, orm_execute_state):
+        if not has_request_context() or "nplusone" not in g:
+            return
+        if orm_execute_state.is_relationship_load and orm_execute_state.lazy_loaded_from is not None:
+            name = str(orm_execute_state.loader_strategy_path[-1])
+            self._count(g.nplusone["relationships"], name)
+            # la SELECT que sigue es la de esta carga, ya contada por relacion
+            g.nplusone["lazy_pending"] = True
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not has_request_context() or "nplusone" not in g:
+            return
+        # un autoflush puede colar INSERT/UPDATE antes de la SELECT de la carga
+        if not statement.lstrip().upper().startswith("SELECT"):
+            return
+        if g.nplusone["lazy_pending"]:
+            g.nplusone["lazy_pending"] = False
+            return
+        self._count(g.nplusone["statements"], statement)
+
+    def _count(self, counts, key):
+        count, stack = counts.get(key, (0, None))
+        counts[key] = (count + 1, stack if stack is not None else self._stack())
+
+    def _stack(self):
+        # frames de la app (src/api), de la ruta hacia dentro
+        frames = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self._source_root) and filename != __file__:
+                frames.append(f"{os.path.basename(filename)}:{frame.f_lineno} in {frame.f_code.co_name}")
+            frame = frame.f_back
+        return list(reversed(frames))
+
+
+nplusone_detector = NPlusOneDetector()
+
+
+def check_hot_paths(app, paths=HOT_PATHS):
+    """Devuelve [(metodo, ruta, status, problemas)] y None si no hay datos."""
+    with app.app_context():
+        user_id, ids = sample_ids()
+        if ids is None:
+            return None
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+
+    previous_mode = nplusone_detector.mode
+    nplusone_detector.enable("log" if previous_mode == "off" else previous_mode)
+    nplusone_detector.collected = []
+    client = app.test_client()
+    results = []
+    try:
+        for method, path, body in paths:
+            path, body = fill_path(path, ids), fill_path(body, ids)
+            response_cache.clear()
+            nplusone_detector.collected.clear()
+            response = client.open(path, method=method, json=body, headers=headers)
+            problems = nplusone_detector.collected[0] if nplusone_detector.collected else []
+            results.append((method, path, response.status_code, problems))
+    finally:
+        nplusone_detector.collected = None
+        nplusone_detector.mode = previous_mode
+    return results
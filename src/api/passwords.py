@@ -0,0 +1,85 @@
+"""
+Hash y verificacion de contraseñas con bcrypt fuera del hilo de la peticion.
+
+bcrypt libera el GIL mientras calcula, asi que un pool de hilos acotado
+limita cuantos hashes corren a la vez en cada worker (y cuanta CPU se llevan),
+y una cola con tope rechaza rapido (503) cuando llega una rafaga de logins en
+lugar de dejar a todas las peticiones esperando en fila.
+
+El coste (BCRYPT_LOG_ROUNDS) es configurable; los hashes con un coste distinto
+se rehacen de forma transparente cuando el usuario inicia sesion.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def hash_cost(password_hash):
+    # "$2b$12$..." -> 12; None si el hash no es de bcrypt
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+
+    def __init__(self, rounds=12, workers=2, max_pending=16, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.rounds = int(app.config.setdefault(
+            'BCRYPT_LOG_ROUNDS', int(os.getenv('BCRYPT_LOG_ROUNDS', self.rounds))))
+        self.workers = int(app.config.setdefault(
+            'PASSWORD_HASH_WORKERS', int(os.getenv('PASSWORD_HASH_WORKERS', self.workers))))
+        self.max_pending = int(app.config.setdefault(
+            'PASSWORD_HASH_MAX_PENDING', int(os.getenv('PASSWORD_HASH_MAX_PENDING', self.max_pending))))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _run(self, fn, *args):
+        # un hueco por tarea en cola o en ejecucion; sin hueco, fallamos rapido
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # el pool no dio abasto a tiempo: para el cliente es lo mismo que la cola llena
+            raise PasswordHasherBusy() from None
+
+    def generate_password_hash(self, password, rounds=None):
+        salt = bcrypt.gensalt(rounds or self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def check_password_hash(self, password_hash, password):
+        if not password_hash or password is None:
+            return False
+        try:
+            return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            # hash vacio o que no es de bcrypt (p. ej. usuarios de Google)
+            return False
+
+    def needs_rehash(self, password_hash):
+        return hash_cost(password_hash) != self.rounds
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,181 @@
+"""
+Perfil bajo demanda de una peticion concreta.
+
+Se activa por peticion con la cabecera "X-Profile: 1" y ademas
+"X-Profile-Secret: <PROFILER_SECRET>" o un JWT de un usuario con role admin.
+Para esa peticion se guarda:
+- un perfil cProfile (las 40 funciones con mas tiempo acumulado)
+- cada sentencia SQL con su duracion y la linea de la app que la lanzo
+en un buffer circular en memoria (PROFILER_MAX_ENTRIES, 50 por defecto) que se
+ve en el panel de Flask-Admin (/admin/profiles). La respuesta lleva la cabecera
+X-Profile-Id con el id de la entrada. Desde el navegador el panel pide
+PROFILER_SECRET una vez y lo recuerda en la sesion (session_token()).
+
+Con el switch apagado el unico coste es mirar la cabecera: los listeners de
+SQL se registran la primera vez que se perfila algo. El buffer es por worker.
+"""
+import cProfile
+import datetime
+import hashlib
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import event
+
+PROFILE_HEADER = "X-Profile"
+SECRET_HEADER = "X-Profile-Secret"
+MAX_STATEMENTS = 500
+STATS_LINES = 40
+
+
+class RequestProfiler:
+
+    def __init__(self, max_entries=50):
+        self.entries = deque(maxlen=max_entries)
+        self.secret = None
+        self.engine = None
+        self._listening = False
+        self._lock = threading.Lock()
+        self._source_root = os.path.dirname(os.path.abspath(__file__))
+
+    def init_app(self, app, engine):
+        self.secret = app.config.setdefault('PROFILER_SECRET', os.getenv('PROFILER_SECRET'))
+        max_entries = int(app.config.setdefault(
+            'PROFILER_MAX_ENTRIES', os.getenv('PROFILER_MAX_ENTRIES', self.entries.maxlen)))
+        self.entries = deque(maxlen=max_entries)
+        self.engine = engine
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def get(self, profile_id):
+        for entry in self.entries:
+            if entry["id"] == profile_id:
+                return entry
+        return None
+
+    def check_secret(self, provided):
+        # en bytes: compare_digest con str falla (TypeError) si hay caracteres no ASCII
+        return bool(self.secret and provided and hmac.compare_digest(
+            provided.encode("utf-8"), self.secret.encode("utf-8")))
+
+    def session_token(self):
+        # lo que guarda la sesion del panel: derivado del secreto, para que una
+        # cookie firmada con una FLASK_APP_KEY conocida no baste para entrar
+        if not self.secret:
+            return None
+        return hmac.new(self.secret.encode("utf-8"), b"admin-profiles", hashlib.sha256).hexdigest()
+
+    def authorized(self):
+        if self.check_secret(request.headers.get(SECRET_HEADER)):
+            return True
+        try:
+            verify_jwt_in_request(optional=True)
+        except Exception:
+            return False
+        return get_jwt().get("role") == "admin"
+
+    def _ensure_listeners(self):
+        if self._listening:
+            return
+        with self._lock:
+            if not self._listening:
+                event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+                event.listen(self.engine, "after_cursor_execute", self._after_cursor_execute)
+                self._listening = True
+
+    def _before_request(self):
+        if request.headers.get(PROFILE_HEADER) != "1" or not self.authorized():
+            return
+        self._ensure_listeners()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: solo un perfil activo a la vez por proceso
+            profiler = None
+        g.profile = {
+            "id": uuid.uuid4().hex[:12],
+            "profiler": profiler,
+            "statements": [],
+            "start": time.perf_counter(),
+        }
+
+    def _after_request(self, response):
+        if "profile" in g:
+            entry = self._finish(response.status_code)
+            response.headers["X-Profile-Id"] = entry["id"]
+        return response
+
+    def _teardown_request(self, exc):
+        # si la vista lanzo una excepcion after_request no se llama
+        if "profile" in g and not g.profile.get("done"):
+            self._finish(500)
+
+    def _finish(self, status):
+        profile = g.profile
+        profile["done"] = True
+        duration = time.perf_counter() - profile["start"]
+        profiler = profile["profiler"]
+        stats = "Otro perfil estaba activo en este proceso; solo se registro el SQL.\n"
+        if profiler is not None:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(STATS_LINES)
+            stats = stream.getvalue()
+
+        statements = profile["statements"]
+        entry = {
+            "id": profile["id"],
+            "created_at": datetime.datetime.utcnow(),
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "route": request.url_rule.rule if request.url_rule is not None else None,
+            "status": status,
+            "duration_ms": duration * 1000,
+            "sql_count": len(statements),
+            "sql_ms": sum(statement["duration_ms"] for statement in statements),
+            "statements": statements,
+            "stats": stats,
+        }
+        self.entries.append(entry)
+        return entry
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and "profile" in g:
+            conn.info["profile_query_start"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("profile_query_start", None)
+        if start is None or not has_request_context() or "profile" not in g:
+            return
+        statements = g.profile["statements"]
+        if len(statements) < MAX_STATEMENTS:
+            # sin parametros: el buffer se ve desde el panel y pueden ser datos de usuarios
+            statements.append({
+                "sql": statement,
+                "duration_ms": (time.perf_counter() - start) * 1000,
+                "caller": self._caller(),
+            })
+
+    def _caller(self):
+        # primera linea de la app (src/api, fuera de este modulo) en la pila
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(self._source_root) and filename != __file__:
+                return f"{os.path.basename(filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+            frame = frame.f_back
+        return None
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,203 @@
+"""
+Auditoria de planes de consulta de las rutas calientes.
+
+audit_hot_paths() llama a cada ruta de HOT_PATHS con el test client, captura
+las SELECT que emite (con sus parametros) y les pide el plan a la base de
+datos. Una ruta falla si algun plan recorre entera una tabla que no esta en
+SCAN_ALLOWED. Pensado para correr sobre una base con datos de prueba:
+    $ flask explain-hot-paths
+
+count_hot_path_queries() cuenta las sentencias de las rutas de QUERY_COUNT_PATHS
+con dos tamanos (limit=2 y limit=20, y la nota con menos y con mas
+comentarios): el numero no debe crecer con la pagina.
+    $ flask check-query-counts
+
+En Postgres se desactiva enable_seqscan mientras se explica: con tablas
+pequenas el planner prefiere el scan secuencial aunque exista el indice, asi
+que solo queda un "Seq Scan" cuando no hay ningun indice utilizable.
+"""
+import re
+from urllib.parse import quote
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func
+
+from api.cache import response_cache
+from api.models import db, User, Notes, Comments, Tags, UserNoteFavorites
+from api.utils import encode_cursor
+
+# tablas de referencia pequenas que se leen enteras a proposito
+SCAN_ALLOWED = {"tags"}
+
+# (metodo, ruta, body); {note_id}, {comment_id} y {tag} se rellenan con datos reales
+HOT_PATHS = [
+    ("GET", "/api/notes", None),
+    ("GET", "/api/notes?cursor={notes_cursor}", None),
+    ("GET", "/api/notes/trending", None),
+    ("GET", "/api/notes/{note_id}", None),
+    ("GET", "/api/notes/{note_id}/comments", None),
+    ("GET", "/api/notes/search?tag={tag}", None),
+    ("GET", "/api/profile", None),
+    ("GET", "/api/profile/notes", None),
+    ("GET", "/api/favorites", None),
+    ("GET", "/api/favorites/ids", None),
+    ("GET", "/api/notifications", None),
+    ("GET", "/api/notifications/unread-count", None),
+    ("GET", "/api/votes/count?note_id={note_id}", None),
+    ("GET", "/api/votes/my-vote?note_id={note_id}", None),
+    ("POST", "/api/viewer-state", {"note_ids": ["{note_id}"], "comment_ids": ["{comment_id}"]}),
+]
+
+# listados y detalle: una consulta por fila de la pagina es un N+1
+QUERY_COUNT_PATHS = [path for path in HOT_PATHS if path[1] in (
+    "/api/notes", "/api/notes/{note_id}", "/api/notes/{note_id}/comments", "/api/favorites")]
+
+# (nombre, limit) de las dos medidas de count_hot_path_queries
+QUERY_COUNT_SIZES = (("small", 2), ("large", 20))
+
+_PG_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(.*)$")
+
+
+def explain(connection, statement, parameters):
+    if connection.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters).all()
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+def sequential_scans(dialect, plan):
+    tables = []
+    for line in plan:
+        if dialect == 'postgresql':
+            match = _PG_SEQ_SCAN.search(line)
+            if match:
+                tables.append(match.group(1))
+            continue
+        match = _SQLITE_SCAN.match(line.strip())
+        # "SCAN t USING INDEX ..." recorre un indice, no la tabla
+        if match and "USING" not in match.group(2) and "VIRTUAL TABLE" not in match.group(2):
+            tables.append(match.group(1))
+    # SQLite nombra las tablas por su alias (user_1, notes_2...)
+    return [re.sub(r"_\d+$", "", table) for table in tables]
+
+
+def fill_path(value, ids):
+    if isinstance(value, str):
+        filled = value.format(**ids)
+        return int(filled) if value.startswith("{") and filled.isdigit() else filled
+    if isinstance(value, list):
+        return [fill_path(item, ids) for item in value]
+    if isinstance(value, dict):
+        return {key: fill_path(item, ids) for key, item in value.items()}
+    return value
+
+
+def sample_ids():
+    note = Notes.query.order_by(Notes.note_id).first()
+    comment = Comments.query.order_by(Comments.comment_id).first()
+    tag = Tags.query.order_by(Tags.tag_id).first()
+    user = User.query.order_by(User.id).first()
+    if not (note and comment and tag and user):
+        return None, None
+    return user.id, {
+        "note_id": note.note_id,
+        "comment_id": comment.comment_id,
+        "tag": quote(tag.name),
+        "notes_cursor": encode_cursor(note.created_at, note.note_id),
+    }
+
+
+def audit_hot_paths(app, paths=HOT_PATHS):
+    """Devuelve [(metodo, ruta, status, [(tabla, sql)])] y None si no hay datos."""
+    with app.app_context():
+        user_id, ids = sample_ids()
+        if ids is None:
+            return None
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        engine = db.engine
+        dialect = engine.dialect.name
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    client = app.test_client()
+    results = []
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for method, path, body in paths:
+            path, body = fill_path(path, ids), fill_path(body, ids)
+            captured.clear()
+            response_cache.clear()
+            response = client.open(path, method=method, json=body, headers=headers)
+            statements = list(captured)
+
+            problems = []
+            with engine.connect() as connection:
+                if dialect == 'postgresql':
+                    connection.exec_driver_sql("SET enable_seqscan = off")
+                for statement, parameters in statements:
+                    for table in sequential_scans(dialect, explain(connection, statement, parameters)):
+                        if table not in SCAN_ALLOWED:
+                            problems.append((table, statement))
+                connection.rollback()
+            results.append((method, path, response.status_code, problems))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    return results
+
+
+def _with_limit(path, limit):
+    return f"{path}{'&' if '?' in path else '?'}limit={limit}"
+
+
+def query_count_ids():
+    # la nota con menos comentarios (al menos 2, para que se carguen igual) y
+    # la que mas tiene, y el usuario con mas favoritos
+    comment_count = func.count(Comments.comment_id)
+    by_note = db.session.query(Comments.note_id, comment_count).group_by(
+        Comments.note_id).having(comment_count >= 2)
+    small = by_note.order_by(comment_count, Comments.note_id).first()
+    large = by_note.order_by(comment_count.desc(), Comments.note_id).first()
+    user = db.session.query(UserNoteFavorites.user_id).group_by(UserNoteFavorites.user_id).order_by(
+        func.count().desc(), UserNoteFavorites.user_id).first()
+    if not (small and large and user):
+        return None, None
+    return user.user_id, {"small": {"note_id": small.note_id}, "large": {"note_id": large.note_id}}
+
+
+def count_hot_path_queries(app, paths=QUERY_COUNT_PATHS):
+    """Devuelve [(metodo, ruta, {tamano: (status, sentencias)})] y None si no hay datos."""
+    with app.app_context():
+        user_id, ids = query_count_ids()
+        if ids is None:
+            return None
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        engine = db.engine
+
+    count = [0]
+
+    def counter(conn, cursor, statement, parameters, context, executemany):
+        count[0] += 1
+
+    client = app.test_client()
+    results = []
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        for method, path, body in paths:
+            measured = {}
+            for size, limit in QUERY_COUNT_SIZES:
+                url = _with_limit(fill_path(path, ids[size]), limit)
+                response_cache.clear()
+                count[0] = 0
+                response = client.open(url, method=method, json=fill_path(body, ids[size]),
+                                       headers=headers)
+                measured[size] = (response.status_code, count[0])
+            results.append((method, path, measured))
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    return results
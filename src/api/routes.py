@@ -1,20 +1,84 @@
-from flask import Flask, request, jsonify, url_for, Blueprint, redirect, flash, send_from_directory
-from api.models import db, User, Notes, Tags, Comments, Votes
-from api.utils import generate_sitemap, APIException
+from flask import Flask, request, jsonify, url_for, Blueprint, redirect, flash, send_from_directory, current_app, Response
+from api.models import db, User, Notes, Tags, Comments, Votes, Notifications
+from api.utils import generate_sitemap, APIException, encode_cursor, decode_cursor, parse_limit
+from api.utils import encode_offset_cursor, decode_offset_cursor, encode_score_cursor, decode_score_cursor
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, get_jwt_request_location
 import datetime
+import logging
 import os
-from werkzeug.utils import secure_filename
-
-from api.models import UserNoteFavorites
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
+import mimetypes
+from werkzeug.exceptions import RequestEntityTooLarge, NotFound
+
+from api.models import UserNoteFavorites, normalize_tag_name
+from api.tag_index import tag_index, suggest_tags_from_db, prefix_condition
+from api.search import search_note_ids
+from api.cache import response_cache, cached_response
+from api.passwords import password_hasher, PasswordHasherBusy
+from api.google_auth import google_certs
+from api.images import (PROFILE_PICTURES_FOLDER, MAX_PROFILE_PICTURE_BYTES, NORMALIZED_SIZES,
+                        SENDFILE_MODE, accel_path, UploadTooLarge, UnsupportedImage,
+                        store_profile_picture, schedule_profile_picture_processing,
+                        variant_filename, variant_cache, is_safe_filename,
+                        is_content_addressed, resolve_profile_picture)
+from api.notifications import notification_fanout
+from api.events import event_hub, EventHubFull
+from api.trending import TRENDING_WEIGHTS, bump_trending, unbump_trending
+from api.db_pool import pool_metrics
+from api.metrics import metrics
+from google.auth import exceptions as google_exceptions
+from sqlalchemy import func, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, joinedload
 
 api = Blueprint('api', __name__)
-bcrypt = Bcrypt()
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CLIENT_ID = os.getenv(
+    "GOOGLE_CLIENT_ID", "413075624594-02qpect45v5o3uarjnkr42ldob11s4lk.apps.googleusercontent.com")
+
+
+# Perfiles de carga por endpoint: cada uno lista las relaciones que el
+# serializador va a tocar, para traerlas en un numero fijo de consultas
+# (selectin para colecciones, joined para many-to-one) en vez de un lazy
+# load por nota. Son funciones porque los backrefs (Notes.user, etc.) solo
+# existen una vez configurados los mappers.
+def note_card_loading():
+    # Notes.serialize_card(): tags y autor; los contadores van agregados aparte
+    return (
+        selectinload(Notes.tags),
+        joinedload(Notes.user),
+    )
+
+
+def note_full_loading():
+    # Notes.serialize(): todas las colecciones anidadas y sus usuarios
+    return (
+        selectinload(Notes.tags),
+        joinedload(Notes.user),
+        selectinload(Notes.votes),
+        selectinload(Notes.comments).joinedload(Comments.user),
+        selectinload(Notes.reports),
+        selectinload(Notes.favorited_by).joinedload(UserNoteFavorites.user),
+    )
+
+
+def note_detail_loading():
+    # get_note_by_id: autor y tags
+    return (
+        selectinload(Notes.tags),
+        joinedload(Notes.user),
+    )
+
+
+def note_comments_loading():
+    # get_comments: comentarios con su autor
+    return (
+        selectinload(Notes.comments).joinedload(Comments.user),
+    )
 
 
 
@@ -30,88 +94,97 @@ def allowed_file(filename):
 def upload_profile_picture():
     current_user_id = get_jwt_identity()
 
+    # Cap the whole request before the multipart body is parsed; Werkzeug
+    # spools the file part to disk instead of holding it in memory
+    request.max_content_length = MAX_PROFILE_PICTURE_BYTES + 64 * 1024
+    try:
+        files = request.files
+    except RequestEntityTooLarge:
+        return profile_picture_too_large()
+
     # Check if the post request has the file part
-    if 'file' not in request.files:
+    if 'file' not in files:
         return jsonify({"error": "No file part in the request"}), 400
 
-    file = request.files['file']
+    file = files['file']
 
     # If user does not select file, browser submits empty file without filename
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
 
-    if file and allowed_file(file.filename):
-        # Create a unique filename using user ID and timestamp
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"user_{current_user_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_extension}"
-        filename = secure_filename(filename)
-
-        # Ensure upload directory exists
-        # Use absolute path to avoid issues with relative paths
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        upload_folder = os.path.join(base_dir, 'src', 'front', 'assets', 'img', 'ProfilePictures')
-        
-        print(f"📁 Base directory: {base_dir}")
-        print(f"📁 Upload folder: {upload_folder}")
-        
-        if not os.path.exists(upload_folder):
-            print(f"📁 Creating upload directory: {upload_folder}")
-            os.makedirs(upload_folder, exist_ok=True)
-
-        # Save the file
-        file_path = os.path.join(upload_folder, filename)
-        print(f"💾 Saving file to: {file_path}")
-        file.save(file_path)
-        
-        # Verify file was saved
-        if os.path.exists(file_path):
-            print(f"✅ File saved successfully: {file_path}")
-            print(f"📏 File size: {os.path.getsize(file_path)} bytes")
-        else:
-            print(f"❌ File was not saved: {file_path}")
+    if not allowed_file(file.filename):
+        return jsonify({"error": "File type not allowed. Only PNG, JPG and JPEG files are allowed."}), 400
 
-        # Update user's profile_image_url in database
-        user = User.query.get(current_user_id)
-        if user:
-            user.profile_image_url = filename
-            db.session.commit()
-            print(f"✅ Database updated with filename: {filename}")
+    # The stored name is the hash of the content: duplicates are kept once
+    try:
+        filename, created = store_profile_picture(file.stream)
+    except UploadTooLarge:
+        return profile_picture_too_large()
+    except UnsupportedImage:
+        return jsonify({"error": "File content is not a PNG or JPEG image."}), 400
+
+    if created:
+        schedule_profile_picture_processing(filename)
+
+    # Update user's profile_image_url in database
+    user = User.query.get(current_user_id)
+    if user:
+        user.profile_image_url = filename
+        db.session.commit()
+
+    return jsonify({
+        "message": "File uploaded successfully",
+        "filename": filename,
+        "file_path": f"/api/profile/picture/{filename}"
+    }), 200
 
-        return jsonify({
-            "message": "File uploaded successfully",
-            "filename": filename,
-            "file_path": f"/api/profile/picture/{filename}"
-        }), 200
-    else:
-        return jsonify({"error": "File type not allowed. Only PNG, JPG and JPEG files are allowed."}), 400
+
+def profile_picture_too_large():
+    limit_mb = MAX_PROFILE_PICTURE_BYTES // (1024 * 1024)
+    return jsonify({"error": f"File too large. The limit is {limit_mb} MB."}), 413
 
 
 @api.route('/profile/picture/<filename>', methods=['GET'])
 def get_profile_picture(filename):
-    try:
-        # Use the same absolute path as in upload
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        upload_folder = os.path.join(base_dir, 'src', 'front', 'assets', 'img', 'ProfilePictures')
-        
-        # Debug: Check if file exists
-        file_path = os.path.join(upload_folder, filename)
-        print(f"🔍 Looking for file: {file_path}")
-        print(f"🔍 File exists: {os.path.exists(file_path)}")
-        print(f"📁 Upload folder: {upload_folder}")
-        
-        if not os.path.exists(file_path):
-            print(f"❌ File not found: {file_path}")
-            # List files in directory for debugging
-            if os.path.exists(upload_folder):
-                files = os.listdir(upload_folder)
-                print(f"📋 Files in directory: {files}")
-            return jsonify({"error": "File not found"}), 404
-            
-        print(f"✅ Serving file: {file_path}")
-        return send_from_directory(upload_folder, filename)
-    except Exception as e:
-        print(f"❌ Error serving file: {str(e)}")
-        return jsonify({"error": f"Error serving file: {str(e)}"}), 500
+    if not is_safe_filename(filename):
+        return jsonify({"error": "File not found"}), 404
+
+    # ?w= returns a resized variant (rounded up to a fixed set of widths)
+    width = request.args.get('w', type=int)
+    for attempt in range(2):
+        try:
+            folder, name, etag = resolve_profile_picture(filename, width)
+        except FileNotFoundError:
+            break
+        try:
+            return send_profile_picture(folder, name, etag)
+        except NotFound:
+            if folder == PROFILE_PICTURES_FOLDER:
+                break
+            # the variant was evicted by another worker: regenerate it once
+            variant_cache.forget(name)
+    return jsonify({"error": "File not found"}), 404
+
+
+def send_profile_picture(folder, name, etag):
+    if SENDFILE_MODE in ('x-accel', 'x-sendfile'):
+        path = os.path.join(folder, name)
+        response = current_app.response_class()
+        if SENDFILE_MODE == 'x-accel':
+            response.headers['X-Accel-Redirect'] = accel_path(folder, name)
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        response.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    else:
+        response = send_from_directory(folder, name, etag=False, max_age=31536000)
+
+    # A file name never changes content (content-addressed or timestamped)
+    response.set_etag(etag)
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
 
 
 @api.route('/profile/my-picture', methods=['GET'])
@@ -150,49 +223,175 @@ def handle_hello():
 
 
 @api.route('/tags', methods=['GET'])
+@cached_response("tags")
 def get_tags():
-    all_tags = Tags.query.all()
-    serialized_tags = []
-    for tag in all_tags:
-        serialized_tags.append({
-            "tag_id": tag.tag_id,
-            "name": tag.name
-        })
+    # los tags casi nunca cambian: se sirven desde el registro en memoria
+    serialized_tags = tag_index.all_tags()
+    if serialized_tags is None:
+        serialized_tags = [tag.serialize() for tag in Tags.query.order_by(Tags.tag_id).all()]
     return jsonify(serialized_tags), 200
 
+# Autocompletar tags por prefijo: primero el indice en memoria, y si el
+# vocabulario es demasiado grande para tenerlo en memoria, la base de datos
+
+
+@api.route('/tags/suggest', methods=['GET'])
+def suggest_tags():
+    prefix = normalize_tag_name(request.args.get('q', ''))
+    limit = parse_limit(request.args.get('limit'), default=10, maximum=50)
+
+    suggestions = tag_index.suggest(prefix, limit)
+    if suggestions is None:
+        suggestions = suggest_tags_from_db(prefix, limit)
+    return jsonify(suggestions), 200
+
 # PAULO Endpoint para obtener todas las notas
 
 
+def paginate_notes(query, after, limit):
+    # Paginacion por keyset sobre (created_at, note_id), de mas nueva a mas vieja.
+    # after es el cursor ya decodificado (o None para la primera pagina)
+    if after:
+        cursor_created_at, cursor_note_id = after
+        query = query.filter(or_(
+            Notes.created_at < cursor_created_at,
+            and_(Notes.created_at == cursor_created_at,
+                 Notes.note_id < cursor_note_id)
+        ))
+
+    # pedimos una fila de mas para saber si hay siguiente pagina
+    rows = query.order_by(Notes.created_at.desc(), Notes.note_id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].note_id)
+    return rows, next_cursor
+
+
+def note_card_counts(note_ids):
+    # Contadores de un lote de notas con consultas agregadas (GROUP BY),
+    # sin cargar cada comentario o favorito en memoria. Los votos ya vienen
+    # en las columnas positive_votes/negative_votes de la nota.
+    counts = {note_id: {} for note_id in note_ids}
+    if not note_ids:
+        return counts
+
+    comment_rows = db.session.query(Comments.note_id, func.count(Comments.comment_id)).filter(
+        Comments.note_id.in_(note_ids)).group_by(Comments.note_id).all()
+    for note_id, total in comment_rows:
+        counts[note_id]["comments_count"] = total
+
+    favorite_rows = db.session.query(UserNoteFavorites.note_id, func.count(UserNoteFavorites.user_id)).filter(
+        UserNoteFavorites.note_id.in_(note_ids)).group_by(UserNoteFavorites.note_id).all()
+    for note_id, total in favorite_rows:
+        counts[note_id]["favorites_count"] = total
+
+    return counts
+
+
+def serialize_note_cards(notes):
+    counts = note_card_counts([note.note_id for note in notes])
+    return [note.serialize_card(counts[note.note_id]) for note in notes]
+
+
 @api.route('/notes', methods=['GET'])
+@cached_response("notes")
 def get_notes():
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
     try:
-        all_notes = Notes.query.all()
-        serialized_notes = [note.serialize() for note in all_notes]
-        return jsonify(serialized_notes), 200
+        page, next_cursor = paginate_notes(
+            Notes.query.options(*note_card_loading()), after, limit)
+        return jsonify({
+            "notes": serialize_note_cards(page),
+            "next_cursor": next_cursor
+        }), 200
 
     except Exception as e:
         print(f"Error en get_notes: {str(e)}")
         return jsonify({"msg": f"Error interno del servidor: {str(e)}"}), 500
 
 
+# Notas ordenadas por trending_score (ver api/trending.py). Keyset sobre
+# (trending_score, note_id): se lee directo del indice ix_notes_trending_score
+@api.route('/notes/trending', methods=['GET'])
+@cached_response("notes")
+def get_trending_notes():
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+
+    query = Notes.query.options(*note_card_loading())
+    if cursor:
+        last_score, last_note_id = decode_score_cursor(cursor)
+        query = query.filter(or_(
+            Notes.trending_score < last_score,
+            and_(Notes.trending_score == last_score, Notes.note_id < last_note_id)
+        ))
+
+    rows = query.order_by(Notes.trending_score.desc(), Notes.note_id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_score_cursor(rows[-1].trending_score, rows[-1].note_id)
+
+    return jsonify({
+        "notes": serialize_note_cards(rows),
+        "next_cursor": next_cursor
+    }), 200
+
+
 @api.route('/notes/search', methods=['GET'])
 def search_notes_by_tag():
-    tag_query = request.args.get('tag', '').strip()
+    # ?q= busca en titulo y contenido; ?tag= mantiene la busqueda por tag
+    if 'q' in request.args:
+        return search_notes_by_text()
 
-    # Buscar notas que contengan el tag especificado
-    notes_with_tag = Notes.query.join(Notes.tags).filter(
-        Tags.name.ilike(f'%{tag_query}%')
+    tag_query = normalize_tag_name(request.args.get('tag', ''))
+
+    # Buscar notas con algun tag que empiece por el texto buscado; el prefijo
+    # sobre name_normalized usa su indice en vez de recorrer toda la tabla
+    notes_with_tag = Notes.query.options(*note_full_loading()).join(Notes.tags).filter(
+        prefix_condition(tag_query)
     ).distinct().all()
 
     serialized_notes = [note.serialize() for note in notes_with_tag]
     return jsonify(serialized_notes), 200
 
+
+def search_notes_by_text():
+    text_query = request.args.get('q', '').strip()
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+    offset = decode_offset_cursor(cursor) if cursor else 0
+
+    if not text_query:
+        return jsonify({"notes": [], "next_cursor": None}), 200
+
+    # ids ordenados por relevancia, pidiendo uno de mas para saber si hay mas
+    note_ids = search_note_ids(text_query, limit + 1, offset)
+    next_cursor = None
+    if len(note_ids) > limit:
+        note_ids = note_ids[:limit]
+        next_cursor = encode_offset_cursor(offset + limit)
+
+    notes_by_id = {
+        note.note_id: note
+        for note in Notes.query.options(*note_card_loading()).filter(Notes.note_id.in_(note_ids))
+    }
+    ranked_notes = [notes_by_id[note_id] for note_id in note_ids if note_id in notes_by_id]
+    return jsonify({
+        "notes": serialize_note_cards(ranked_notes),
+        "next_cursor": next_cursor
+    }), 200
+
 # PAULO Endpoint para obtener todos los comentarios de una nota
 
 
 @api.route('/notes/<int:note_id>/comments', methods=['GET'])
+@cached_response("note:{note_id}:comments")
 def get_comments(note_id):
-    note = Notes.query.get(note_id)
+    note = Notes.query.options(*note_comments_loading()).filter_by(note_id=note_id).first()
     if not note:
         return jsonify({"msg": "La nota no existe."}), 404
     comments_list = [comment.serialize() for comment in note.comments]
@@ -218,27 +417,34 @@ def create_note():
     # <-- Leemos el campo, con un valor por defecto
     is_anonymous = body.get('is_anonymous', False)
 
-    # validamos que sea una lista y que no este vacia
+    # validamos que sea una lista de nombres y que no este vacia
     if not isinstance(tag_names, list) or not tag_names:
         return jsonify({"msg": "Los tags deben ser una lista no vacía"}), 400
+    if not all(isinstance(tag_name, str) for tag_name in tag_names):
+        return jsonify({"msg": "Cada tag debe ser un nombre (texto)"}), 400
 
     new_note = Notes(  # creamos una nueva instancia de Notes
         title=body.get('title'),
         content=body.get('content'),
         user_id=current_user_id,
         is_anonymous=is_anonymous,
+        trending_score=TRENDING_WEIGHTS["note"],
     )
 
     try:  # agregamos los tags a la nota
-        for tag_name in tag_names:
-            # buscamos el tag en la db
-            tag = Tags.query.filter_by(name=tag_name).first()
-            if not tag:
-                return jsonify({"msg": f"El tag '{tag_name}' no existe."}), 400
-            new_note.tags.append(tag)  # si existe, lo agregamos a la nota
+        # todos los tags de la nota en una sola consulta IN; los que no
+        # vuelven en el resultado no existen
+        tags_by_name = {tag.name: tag for tag in Tags.query.filter(
+            Tags.name.in_(set(tag_names))).all()}
+        unknown = [tag_name for tag_name in tag_names if tag_name not in tags_by_name]
+        if unknown:
+            return jsonify({"msg": f"El tag '{unknown[0]}' no existe."}), 400
+        for tag_name in dict.fromkeys(tag_names):
+            new_note.tags.append(tags_by_name[tag_name])
 
         db.session.add(new_note)
         db.session.commit()  # guardamos
+        response_cache.invalidate("notes")
     except Exception as e:
         # si hay errores nos vamos a 0 para evitar que la informacion se quede en el aire
         db.session.rollback()
@@ -246,6 +452,13 @@ def create_note():
 
     return jsonify(new_note.serialize()), 201
 
+
+def password_hasher_busy():
+    # demasiados hashes en cola: mejor que el cliente reintente en un momento
+    response = jsonify({"error": "Servidor ocupado, intenta de nuevo en unos segundos"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
 # endpoint para crear un nuevo usuario
 
 
@@ -262,6 +475,9 @@ def create_user():
     if not all([email, password, first_name, last_name, username]):
         return jsonify({"error": "Todos los campos son obligatorios"}), 400
 
+    if not isinstance(password, str):
+        return jsonify({"error": "La contraseña debe ser texto"}), 400
+
     if len(password) < 8:
         return jsonify({"error": "La contraseña debe tener al menos 8 caracteres"}), 400
 
@@ -271,7 +487,10 @@ def create_user():
     if User.query.filter_by(username=username).first():
         return jsonify({"error": "El nombre de usuario ya está en uso"}), 400
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        hashed_password = password_hasher.generate_password_hash(password)
+    except PasswordHasherBusy:
+        return password_hasher_busy()
 
     new_user = User(
         email=email,
@@ -300,15 +519,27 @@ def create_token():
     email = request.json.get("email", None)
     password = request.json.get("password", None)
 
+    if not isinstance(password, str):
+        return jsonify({"error": "La contraseña debe ser texto"}), 400
+
     user = User.query.filter_by(email=email).first()
 
     if user is None:
         return jsonify({"error": "Email o contraseña invalida"}), 401
 
-    if not bcrypt.check_password_hash(user.password_hash, password):
-        return jsonify({"error": "Email o contraseña invalida"}), 401
+    try:
+        if not password_hasher.check_password_hash(user.password_hash, password):
+            return jsonify({"error": "Email o contraseña invalida"}), 401
+
+        # si el hash tiene un coste distinto al configurado lo rehacemos ahora,
+        # que es el unico momento en que tenemos la contraseña en claro
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = password_hasher.generate_password_hash(password)
+            db.session.commit()
+    except PasswordHasherBusy:
+        return password_hasher_busy()
 
-    access_token = create_access_token(identity=str(user.id))
+    access_token = create_access_token(identity=str(user.id), additional_claims={"role": user.role})
     return jsonify(access_token=access_token)
 
 # Endpoint para obtener todos los usuarios
@@ -343,8 +574,14 @@ def create_comment(note_id):
     )
     db.session.add(new_comment)  # nos preparamos par aguardar lo que recibimos
     try:
+        bump_trending(note_id, TRENDING_WEIGHTS["comment"])
         db.session.commit()  # guardamos
-        return jsonify(new_comment.serialize()), 201
+        response_cache.invalidate("notes", f"note:{note_id}:comments")
+        notification_fanout.publish('comment', current_user_id, note_id=note_id,
+                                    comment_id=new_comment.comment_id)
+        comment_data = new_comment.serialize()
+        event_hub.publish(f"note:{note_id}", "comment", comment_data)
+        return jsonify(comment_data), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": f"Ocurrió un error inesperado: {str(e)}"}), 500
@@ -384,7 +621,8 @@ def get_profile():
 def get_user_notes():
     try:
         current_user_id = get_jwt_identity()
-        user_notes = Notes.query.filter_by(user_id=current_user_id).all()
+        user_notes = Notes.query.options(selectinload(Notes.tags)).filter_by(
+            user_id=current_user_id).all()
 
         serialized_notes = []
         for note in user_notes:
@@ -405,12 +643,13 @@ def get_user_notes():
 
 
 @api.route('/notes/<int:note_id>', methods=['GET'])
+@cached_response("note:{note_id}")
 def get_note_by_id(note_id):
-    note = Notes.query.get(note_id)
+    note = Notes.query.options(*note_detail_loading()).filter_by(note_id=note_id).first()
     if not note:
         return jsonify({"msg": "Nota no encontrada"}), 404
 
-    user = User.query.get(note.user_id)
+    user = note.user
     user_info = None
     if user:
         user_info = {
@@ -459,23 +698,28 @@ def remove_profile_picture():
     if not user.profile_image_url:
         return jsonify({"error": "No hay foto de perfil para eliminar"}), 400
 
-    # Optional: Delete the physical file from the server
-    try:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        upload_folder = os.path.join(base_dir, 'src', 'front', 'assets', 'img', 'ProfilePictures')
-        file_path = os.path.join(upload_folder, user.profile_image_url)
-        
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"✅ Physical file deleted: {file_path}")
-    except Exception as e:
-        print(f"⚠️ Could not delete physical file: {str(e)}")
-        # Continue anyway, as the main goal is to remove from database
+    filename = user.profile_image_url
 
     # Remove from database
     user.profile_image_url = None
     db.session.commit()
 
+    # Content-addressed files can be shared, and a concurrent upload of the
+    # same image may be about to point to this one: checking for references and
+    # deleting here would race with it, so `flask prune-profile-pictures`
+    # removes them later. Older uploads belong to a single user.
+    if not is_content_addressed(filename) and not User.query.filter_by(profile_image_url=filename).first():
+        try:
+            candidates = [filename] + [variant_filename(filename, size) for size in NORMALIZED_SIZES]
+            for name in candidates:
+                file_path = os.path.join(PROFILE_PICTURES_FOLDER, name)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            variant_cache.discard(filename)
+        except OSError:
+            # The main goal is to remove it from the database
+            logger.warning("Could not delete profile picture %s", filename, exc_info=True)
+
     return jsonify({"message": "Foto de perfil eliminada exitosamente"}), 200
 
 # MAIN NUEVO ENDPOINT: para actualizar un comentario
@@ -503,6 +747,7 @@ def update_comment(comment_id):
 
     try:
         db.session.commit()
+        response_cache.invalidate(f"note:{comment.note_id}:comments")
         return jsonify({
             "comment_id": comment.comment_id,
             "note_id": comment.note_id,
@@ -529,14 +774,31 @@ def delete_comment(comment_id):
     if comment.user_id != current_user_id:
         return jsonify({"msg": "No tienes permiso para eliminar este comentario."}), 403
 
+    note_id = comment.note_id
     try:
+        discount_unread_notifications(Notifications.comment_id == comment_id)
         db.session.delete(comment)
+        # lo que sumo create_comment (ya decaido), en la misma transaccion
+        unbump_trending(note_id, TRENDING_WEIGHTS["comment"], comment.created_at)
         db.session.commit()
+        response_cache.invalidate("notes", f"note:{note_id}:comments")
         return jsonify({"msg": "Comentario eliminado exitosamente."}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": f"Ocurrió un error al eliminar el comentario: {str(e)}"}), 500
 
+def discount_unread_notifications(*conditions):
+    # Antes de un borrado que se lleva notificaciones en cascada: resta a cada
+    # destinatario las no leidas que van a desaparecer, en la misma transaccion
+    # (como al marcarlas leidas)
+    rows = db.session.query(Notifications.recipient_user_id, func.count()).filter(
+        Notifications.is_read.is_(False), or_(*conditions)).group_by(
+        Notifications.recipient_user_id).all()
+    for recipient_user_id, unread in rows:
+        User.query.filter(User.id == recipient_user_id).update(
+            {User.unread_notifications: User.unread_notifications - unread},
+            synchronize_session=False)
+
 # endpoint para eliminar una nota
 
 
@@ -554,14 +816,120 @@ def delete_note(note_id):
         return jsonify({"msg": "No puedes eliminar notas que no son tuyas"}), 403
 
     try:
+        # las notificaciones de la nota y de sus comentarios se borran en cascada
+        discount_unread_notifications(
+            Notifications.note_id == note_id,
+            Notifications.comment_id.in_(db.session.query(Comments.comment_id).filter(
+                Comments.note_id == note_id)))
         db.session.delete(note)  # eliminamos
         db.session.commit()  # guardamos
+        response_cache.invalidate("notes", f"note:{note_id}", f"note:{note_id}:comments")
         return jsonify({"msg": "Nota eliminada exitosamente"}), 200
     except Exception as e:
         # si hay errores nos vamos a 0 para evitar que la informacion se quede en el aire
         db.session.rollback()
         return jsonify({"msg": f"Ocurrió un error inesperado: {str(e)}"}), 500
 
+# Columna contador que corresponde a cada tipo de voto
+VOTE_COUNTER_COLUMNS = {1: "positive_votes", -1: "negative_votes"}
+
+
+def adjust_vote_counters(note_id, comment_id, deltas):
+    # UPDATE ... SET col = col + delta: lo resuelve la base de datos de forma
+    # atomica dentro de la transaccion del voto, sin leer el valor antes.
+    # deltas es {vote_type: delta}; un cambio de voto mueve las dos columnas
+    # en el mismo UPDATE
+    model = Notes if note_id else Comments
+    target = Notes.note_id == note_id if note_id else Comments.comment_id == comment_id
+    values = {}
+    for vote_type, delta in deltas.items():
+        if delta:
+            column = getattr(model, VOTE_COUNTER_COLUMNS[vote_type])
+            values[column] = column + delta
+    # los votos de la nota tambien mueven su trending_score, en el mismo UPDATE
+    trending_delta = sum(vote_type * delta for vote_type, delta in deltas.items())
+    if note_id and trending_delta:
+        values[Notes.trending_score] = Notes.trending_score + TRENDING_WEIGHTS["vote"] * trending_delta
+    if values:
+        db.session.query(model).filter(target).update(values, synchronize_session=False)
+
+
+def vote_counter_deltas(action, vote_type):
+    if action == "added":
+        return {vote_type: 1}
+    # "updated": el voto paso del tipo contrario a este
+    return {vote_type: 1, -vote_type: -1}
+
+
+def upsert_vote_row(user_id, note_id, comment_id, vote_type):
+    # Una sola sentencia INSERT ... ON CONFLICT DO UPDATE contra la restriccion
+    # unica (user_id, note_id) o (user_id, comment_id). El WHERE del DO UPDATE
+    # hace que repetir el mismo voto no toque la fila, y updated_at (NULL al
+    # insertar) dice si la fila se creo o se cambio.
+    # Devuelve "added", "updated" o None si el voto ya era ese.
+    if db.engine.dialect.name == 'postgresql':
+        statement = postgresql.insert(Votes)
+    else:
+        statement = sqlite.insert(Votes)
+    statement = statement.values(
+        user_id=user_id, note_id=note_id, comment_id=comment_id, vote_type=vote_type)
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id', 'note_id' if note_id else 'comment_id'],
+        set_={"vote_type": statement.excluded.vote_type, "updated_at": func.now()},
+        where=Votes.vote_type != statement.excluded.vote_type
+    ).returning(Votes.updated_at)
+
+    row = db.session.execute(statement).first()
+    if row is None:
+        return None
+    return "added" if row.updated_at is None else "updated"
+
+
+def upsert_vote(user_id, note_id, comment_id, vote_type):
+    # voto y contadores en la misma transaccion
+    action = upsert_vote_row(user_id, note_id, comment_id, vote_type)
+    if action:
+        adjust_vote_counters(note_id, comment_id, vote_counter_deltas(action, vote_type))
+    return action
+
+
+def invalidate_vote_target(note_id, comment_id):
+    # el feed muestra los votos de las notas; los de comentarios salen en su listado
+    if note_id:
+        response_cache.invalidate("notes")
+    else:
+        comment_note_id = db.session.query(Comments.note_id).filter(
+            Comments.comment_id == comment_id).scalar()
+        response_cache.invalidate(f"note:{comment_note_id}:comments")
+
+
+def broadcast_vote_counts(note_id, comment_id):
+    # solo se consulta si hay algun stream abierto en este worker
+    if not event_hub.has_subscribers():
+        return
+    if note_id:
+        if not event_hub.has_subscribers(f"note:{note_id}"):
+            return
+        counters = db.session.query(Notes.positive_votes, Notes.negative_votes).filter(
+            Notes.note_id == note_id).first()
+        channel_note_id = note_id
+    else:
+        row = db.session.query(Comments.note_id, Comments.positive_votes, Comments.negative_votes).filter(
+            Comments.comment_id == comment_id).first()
+        if row is None:
+            return
+        channel_note_id, counters = row[0], row[1:]
+    if counters is None:
+        return
+    positive_votes, negative_votes = counters
+    event_hub.publish(f"note:{channel_note_id}", "votes", {
+        "note_id": note_id,
+        "comment_id": comment_id,
+        "positive_votes": positive_votes,
+        "negative_votes": negative_votes,
+        "total_votes": positive_votes - negative_votes
+    })
+
 # NUEVO ENDPOINT: Para votar en notas y comentarios
 
 
@@ -582,38 +950,114 @@ def create_vote():
     if vote_type not in [1, -1]:
         return jsonify({"msg": "Tipo de voto inválido"}), 400
 
-    # Buscar si ya existe un voto de este usuario
-    if note_id:
-        existing_vote = Votes.query.filter_by(
-            user_id=current_user_id,
-            note_id=note_id
-        ).first()
-    else:
-        existing_vote = Votes.query.filter_by(
-            user_id=current_user_id,
-            comment_id=comment_id
-        ).first()
-
-    if existing_vote:
-        # Si el voto es del mismo tipo, no permitimos votar de nuevo
-        if existing_vote.vote_type == vote_type:
+    try:
+        action = upsert_vote(current_user_id, note_id, comment_id, vote_type)
+        if action is None:
+            db.session.rollback()
             return jsonify({"msg": "Ya has votado de esta forma"}), 400
-        else:
-            # Si es diferente tipo, lo actualizamos
-            existing_vote.vote_type = vote_type
-            db.session.commit()
-            return jsonify({"msg": "Voto actualizado", "action": "updated"}), 200
-    else:
-        # Crear nuevo voto
-        new_vote = Votes(
-            user_id=current_user_id,
-            note_id=note_id,
-            comment_id=comment_id,
-            vote_type=vote_type
-        )
-        db.session.add(new_vote)
         db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"msg": "Nota o comentario no encontrado"}), 404
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": f"Ocurrió un error inesperado: {str(e)}"}), 500
+
+    invalidate_vote_target(note_id, comment_id)
+    broadcast_vote_counts(note_id, comment_id)
+    if action == "added":
+        notification_fanout.publish('note_vote' if note_id else 'comment_vote', current_user_id,
+                                    note_id=note_id, comment_id=comment_id)
         return jsonify({"msg": "Voto registrado", "action": "added"}), 201
+    return jsonify({"msg": "Voto actualizado", "action": "updated"}), 200
+
+
+MAX_VOTE_BATCH = 100
+
+# Varios votos en una sola transaccion (acciones que el front guardo sin conexion).
+# Body: {"votes": [{"note_id": 1, "vote_type": 1}, {"comment_id": 3, "vote_type": -1}]}
+# Cada voto devuelve su resultado: added, updated, unchanged, invalid o not_found.
+@api.route('/votes/batch', methods=['POST'])
+@jwt_required()
+def create_votes_batch():
+    current_user_id = int(get_jwt_identity())
+    body = request.get_json() or {}
+    votes = body.get('votes')
+
+    if not isinstance(votes, list) or not votes:
+        return jsonify({"msg": "Se requiere una lista de votos"}), 400
+    if len(votes) > MAX_VOTE_BATCH:
+        return jsonify({"msg": f"Como maximo {MAX_VOTE_BATCH} votos por lote"}), 400
+
+    results = [None] * len(votes)
+    valid = []
+    for index, vote in enumerate(votes):
+        note_id = vote.get('note_id') if isinstance(vote, dict) else None
+        comment_id = vote.get('comment_id') if isinstance(vote, dict) else None
+        vote_type = vote.get('vote_type') if isinstance(vote, dict) else None
+        if (not ((note_id and not comment_id) or (comment_id and not note_id))
+                or vote_type not in [1, -1]):
+            results[index] = "invalid"
+            continue
+        # ids enteros como en viewer-state: listas o textos como "abc" son invalidos
+        try:
+            note_id = int(note_id) if note_id else None
+            comment_id = int(comment_id) if comment_id else None
+        except (TypeError, ValueError):
+            results[index] = "invalid"
+            continue
+        if not (note_id or comment_id):
+            results[index] = "invalid"
+            continue
+        valid.append((index, note_id, comment_id, vote_type))
+
+    # existencia de todos los objetivos con una consulta IN por tabla
+    note_ids = {note_id for _, note_id, _, _ in valid if note_id}
+    comment_ids = {comment_id for _, _, comment_id, _ in valid if comment_id}
+    existing_notes = {row[0] for row in db.session.query(Notes.note_id).filter(
+        Notes.note_id.in_(note_ids))} if note_ids else set()
+    comment_notes = dict(db.session.query(Comments.comment_id, Comments.note_id).filter(
+        Comments.comment_id.in_(comment_ids))) if comment_ids else {}
+
+    deltas = {}
+    added = []
+    try:
+        for index, note_id, comment_id, vote_type in valid:
+            if (note_id and note_id not in existing_notes) or (comment_id and comment_id not in comment_notes):
+                results[index] = "not_found"
+                continue
+            # el upsert de cada voto sin tocar contadores; se suman al final
+            action = upsert_vote_row(current_user_id, note_id, comment_id, vote_type)
+            results[index] = action or "unchanged"
+            if action:
+                target = deltas.setdefault((note_id, comment_id), {1: 0, -1: 0})
+                for counter_type, delta in vote_counter_deltas(action, vote_type).items():
+                    target[counter_type] += delta
+                if action == "added":
+                    added.append((note_id, comment_id))
+        # un UPDATE de contadores por objetivo, no por voto
+        for (note_id, comment_id), target_deltas in deltas.items():
+            adjust_vote_counters(note_id, comment_id, target_deltas)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": f"Ocurrió un error inesperado: {str(e)}"}), 500
+
+    if deltas:
+        resources = {f"note:{comment_notes[comment_id]}:comments"
+                     for note_id, comment_id in deltas if comment_id}
+        if any(note_id for note_id, _ in deltas):
+            resources.add("notes")
+        response_cache.invalidate(*resources)
+        for note_id, comment_id in deltas:
+            broadcast_vote_counts(note_id, comment_id)
+    for note_id, comment_id in added:
+        notification_fanout.publish('note_vote' if note_id else 'comment_vote', current_user_id,
+                                    note_id=note_id, comment_id=comment_id)
+
+    return jsonify({"results": [
+        {"index": index, "action": action} for index, action in enumerate(results)
+    ]}), 200
 
 # NUEVO ENDPOINT: Obtener conteo de votos para un elemento
 
@@ -626,16 +1070,14 @@ def get_votes_count():
     if not note_id and not comment_id:
         return jsonify({"msg": "Se requiere note_id o comment_id"}), 400
 
+    # leemos los contadores desnormalizados: una sola fila, sin COUNT
     if note_id:
-        positive_votes = Votes.query.filter_by(
-            note_id=note_id, vote_type=1).count()
-        negative_votes = Votes.query.filter_by(
-            note_id=note_id, vote_type=-1).count()
+        counters = db.session.query(Notes.positive_votes, Notes.negative_votes).filter(
+            Notes.note_id == note_id).first()
     else:
-        positive_votes = Votes.query.filter_by(
-            comment_id=comment_id, vote_type=1).count()
-        negative_votes = Votes.query.filter_by(
-            comment_id=comment_id, vote_type=-1).count()
+        counters = db.session.query(Comments.positive_votes, Comments.negative_votes).filter(
+            Comments.comment_id == comment_id).first()
+    positive_votes, negative_votes = counters if counters else (0, 0)
 
     return jsonify({
         "positive_votes": positive_votes,
@@ -671,7 +1113,61 @@ def get_my_vote():
         return jsonify({"vote_type": vote.vote_type}), 200
     else:
         return jsonify({"vote_type": 0}), 200
-    
+
+
+MAX_VIEWER_STATE_IDS = 200
+
+# Estado del usuario para muchas notas/comentarios de una vez (feed, detalle):
+# su voto y si la nota esta en favoritos. Una consulta IN a votes y otra a
+# favoritos, en vez de un /votes/my-vote por elemento.
+# Body: {"note_ids": [1, 2], "comment_ids": [7]}
+@api.route('/viewer-state', methods=['POST'])
+@jwt_required()
+def get_viewer_state():
+    current_user_id = int(get_jwt_identity())
+    body = request.get_json() or {}
+    note_ids = body.get('note_ids') or []
+    comment_ids = body.get('comment_ids') or []
+
+    if not isinstance(note_ids, list) or not isinstance(comment_ids, list):
+        return jsonify({"msg": "note_ids y comment_ids deben ser listas"}), 400
+    try:
+        note_ids = {int(note_id) for note_id in note_ids}
+        comment_ids = {int(comment_id) for comment_id in comment_ids}
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Los ids deben ser numeros"}), 400
+    if len(note_ids) + len(comment_ids) > MAX_VIEWER_STATE_IDS:
+        return jsonify({"msg": f"Como maximo {MAX_VIEWER_STATE_IDS} ids por peticion"}), 400
+
+    notes = {note_id: {"vote_type": 0, "is_favorite": False} for note_id in note_ids}
+    comments = {comment_id: {"vote_type": 0} for comment_id in comment_ids}
+
+    targets = []
+    if note_ids:
+        targets.append(Votes.note_id.in_(note_ids))
+    if comment_ids:
+        targets.append(Votes.comment_id.in_(comment_ids))
+    if targets:
+        votes = db.session.query(Votes.note_id, Votes.comment_id, Votes.vote_type).filter(
+            Votes.user_id == current_user_id, or_(*targets)).all()
+        for note_id, comment_id, vote_type in votes:
+            if note_id in notes:
+                notes[note_id]["vote_type"] = vote_type
+            elif comment_id in comments:
+                comments[comment_id]["vote_type"] = vote_type
+
+    if note_ids:
+        favorites = db.session.query(UserNoteFavorites.note_id).filter(
+            UserNoteFavorites.user_id == current_user_id,
+            UserNoteFavorites.note_id.in_(note_ids)).all()
+        for (note_id,) in favorites:
+            notes[note_id]["is_favorite"] = True
+
+    return jsonify({
+        "notes": {str(note_id): state for note_id, state in notes.items()},
+        "comments": {str(comment_id): state for comment_id, state in comments.items()}
+    }), 200
+
 
 
  #----------------------- rutas para lista de favoritos
@@ -692,7 +1188,9 @@ def add_favorite(note_id):
     new_fav = UserNoteFavorites(user_id=current_user_id, note_id=note_id)
     db.session.add(new_fav)
     try:
+        bump_trending(note_id, TRENDING_WEIGHTS["favorite"])
         db.session.commit()
+        response_cache.invalidate("notes")
         return jsonify({"msg": "Nota agregada a favoritos"}), 201
     except Exception as e:
         db.session.rollback()
@@ -710,26 +1208,61 @@ def remove_favorite(note_id):
 
     db.session.delete(favorite)
     try:
+        # lo que sumo add_favorite (ya decaido), en la misma transaccion
+        unbump_trending(note_id, TRENDING_WEIGHTS["favorite"], favorite.created_at)
         db.session.commit()
+        response_cache.invalidate("notes")
         return jsonify({"msg": "Nota removida de favoritos"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": f"Error interno: {str(e)}"}), 500
 
-# Obtener lista de notas favoritas del usuario
+# Obtener lista de notas favoritas del usuario, paginada por keyset sobre
+# (fecha en que se marco, note_id), la mas reciente primero. Una consulta con
+# join para la pagina mas las de tags/autor y contadores de serialize_card.
 @api.route('/favorites', methods=['GET'])
 @jwt_required()
 def get_favorites():
     current_user_id = get_jwt_identity()
-    favorites = UserNoteFavorites.query.filter_by(user_id=current_user_id).all()
-
-    notes = []
-    for fav in favorites:
-        note = Notes.query.get(fav.note_id)
-        if note:
-            notes.append(note.serialize())
-
-    return jsonify(notes), 200
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+
+    query = db.session.query(Notes, UserNoteFavorites.created_at).join(
+        UserNoteFavorites, UserNoteFavorites.note_id == Notes.note_id
+    ).filter(UserNoteFavorites.user_id == current_user_id).options(*note_card_loading())
+    if after:
+        favorited_at, last_note_id = after
+        query = query.filter(or_(
+            UserNoteFavorites.created_at < favorited_at,
+            and_(UserNoteFavorites.created_at == favorited_at,
+                 UserNoteFavorites.note_id < last_note_id)
+        ))
+
+    rows = query.order_by(UserNoteFavorites.created_at.desc(),
+                          UserNoteFavorites.note_id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0].note_id)
+
+    counts = note_card_counts([note.note_id for note, _ in rows])
+    favorites = []
+    for note, favorited_at in rows:
+        card = note.serialize_card(counts[note.note_id])
+        card["favorited_at"] = favorited_at.isoformat() if favorited_at else None
+        favorites.append(card)
+
+    return jsonify({"favorites": favorites, "next_cursor": next_cursor}), 200
+
+# Solo los ids de las notas favoritas, para pintar los corazones del feed
+@api.route('/favorites/ids', methods=['GET'])
+@jwt_required()
+def get_favorite_ids():
+    current_user_id = get_jwt_identity()
+    note_ids = db.session.query(UserNoteFavorites.note_id).filter(
+        UserNoteFavorites.user_id == current_user_id).all()
+    return jsonify({"note_ids": [row[0] for row in note_ids]}), 200
 
 
     #------------------ api de google
@@ -740,7 +1273,7 @@ def google_login():
     token = data.get("token")
 
     try:
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), "413075624594-02qpect45v5o3uarjnkr42ldob11s4lk.apps.googleusercontent.com")
+        idinfo = google_certs.verify_oauth2_token(token, GOOGLE_CLIENT_ID)
         email = idinfo['email']
         first_name = idinfo.get('given_name', '')
         last_name = idinfo.get('family_name', '')
@@ -759,8 +1292,142 @@ def google_login():
             db.session.add(user)
             db.session.commit()
 
-        access_token = create_access_token(identity=str(user.id))
+        access_token = create_access_token(identity=str(user.id), additional_claims={"role": user.role})
         return jsonify(access_token=access_token), 200
 
+    except google_exceptions.TransportError:
+        # sin certificados de Google (ni copia en cache) no podemos verificar
+        return jsonify({"error": "No se pudo verificar el token con Google, intenta de nuevo"}), 503
+    except (ValueError, google_exceptions.GoogleAuthError):
+        return jsonify({"error": "Token inválido"}), 400
+
+
+ #----------------------- notificaciones
+
+# Notificaciones del usuario, de la mas nueva a la mas vieja (keyset por id)
+@api.route('/notifications', methods=['GET'])
+@jwt_required()
+def get_notifications():
+    current_user_id = int(get_jwt_identity())
+    limit = parse_limit(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+
+    query = Notifications.query.options(joinedload(Notifications.actor)).filter(
+        Notifications.recipient_user_id == current_user_id)
+    if request.args.get('unread') == '1':
+        query = query.filter(Notifications.is_read.is_(False))
+    if cursor:
+        _, last_id = decode_cursor(cursor)
+        query = query.filter(Notifications.notification_id < last_id)
+
+    rows = query.order_by(Notifications.notification_id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].notification_id)
+
+    return jsonify({
+        "notifications": [notification.serialize() for notification in rows],
+        "next_cursor": next_cursor
+    }), 200
+
+# Marcar como leidas: una lista de ids o todas ({"all": true})
+@api.route('/notifications/mark-read', methods=['POST'])
+@jwt_required()
+def mark_notifications_read():
+    current_user_id = int(get_jwt_identity())
+    body = request.get_json() or {}
+    notification_ids = body.get('notification_ids')
+    mark_all = body.get('all') is True
+
+    if not mark_all and (not isinstance(notification_ids, list) or not notification_ids):
+        return jsonify({"msg": "Se requiere notification_ids (lista) o all: true"}), 400
+
+    query = Notifications.query.filter(
+        Notifications.recipient_user_id == current_user_id,
+        Notifications.is_read.is_(False))
+    if not mark_all:
+        query = query.filter(Notifications.notification_id.in_(notification_ids))
+
+    try:
+        # un solo UPDATE; el contador baja exactamente lo que se marco
+        marked = query.update({Notifications.is_read: True}, synchronize_session=False)
+        if marked:
+            User.query.filter(User.id == current_user_id).update(
+                {User.unread_notifications: User.unread_notifications - marked},
+                synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": f"Error interno: {str(e)}"}), 500
+
+    return jsonify({"marked": marked}), 200
+
+# Contador de no leidas: se lee de User.unread_notifications, sin COUNT(*)
+@api.route('/notifications/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_notifications_count():
+    current_user_id = int(get_jwt_identity())
+    unread = db.session.query(User.unread_notifications).filter(
+        User.id == current_user_id).scalar()
+    if unread is None:
+        return jsonify({"error": "Usuario no encontrado"}), 404
+    return jsonify({"unread": max(unread, 0)}), 200
+
+
+ #----------------------- eventos en vivo (SSE)
+
+MAX_STREAM_NOTES = 50
+STREAM_TOKEN_EXPIRES = datetime.timedelta(seconds=60)
+
+# Token de un minuto que solo sirve para abrir /api/events. EventSource no
+# manda cabeceras y el token va en la URL (?jwt=), que acaba en los logs de
+# acceso: mejor uno que caduca enseguida que el access token del usuario.
+@api.route('/events/token', methods=['POST'])
+@jwt_required()
+def create_stream_token():
+    token = create_access_token(identity=get_jwt_identity(), expires_delta=STREAM_TOKEN_EXPIRES,
+                                additional_claims={"scope": "events"})
+    return jsonify({"token": token, "expires_in": int(STREAM_TOKEN_EXPIRES.total_seconds())}), 200
+
+# Stream de eventos: notificaciones del usuario y comentarios/votos de las notas
+# pedidas (?notes=1,2,3). Con cabecera Authorization vale el access token; por
+# ?jwt= solo el de POST /api/events/token. No se toca la base de datos: el
+# stream solo lee de la cola en memoria del hub.
+@api.route('/events', methods=['GET'])
+@jwt_required(locations=["headers", "query_string"])
+def stream_events():
+    if get_jwt_request_location() == "query_string" and get_jwt().get("scope") != "events":
+        return jsonify({"msg": "En la URL solo se acepta el token de POST /api/events/token"}), 401
+    current_user_id = int(get_jwt_identity())
+    try:
+        note_ids = {int(value) for value in request.args.get('notes', '').split(',') if value.strip()}
     except ValueError:
-        return jsonify({"error": "Token inválido"}), 400
\ No newline at end of file
+        return jsonify({"msg": "notes debe ser una lista de ids separados por comas"}), 400
+    if len(note_ids) > MAX_STREAM_NOTES:
+        return jsonify({"msg": f"Como maximo {MAX_STREAM_NOTES} notas por stream"}), 400
+
+    channels = [f"user:{current_user_id}"] + [f"note:{note_id}" for note_id in note_ids]
+    try:
+        subscription = event_hub.subscribe(channels)
+    except EventHubFull:
+        response = jsonify({"msg": "Demasiadas conexiones abiertas, intenta mas tarde"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+    response = Response(event_hub.stream(subscription), mimetype='text/event-stream')
+    response.headers["Cache-Control"] = "no-cache"
+    # que nginx no acumule el stream en su buffer
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+ #----------------------- metricas
+
+# Estado del pool de conexiones de este worker: esperas de checkout,
+# conexiones en uso y overflow (ver api/db_pool.py). Mismo METRICS_TOKEN que /metrics
+@api.route('/metrics/db-pool', methods=['GET'])
+def get_db_pool_metrics():
+    if not metrics.authorized():
+        return jsonify({"msg": "unauthorized"}), 401
+    return jsonify(pool_metrics.snapshot()), 200
@@ -0,0 +1,107 @@
+"""
+Busqueda de texto completo sobre el titulo y el contenido de las notas.
+
+- Postgres: columna generada notes.search_vector (tsvector, titulo con peso A y
+  contenido con peso B) con indice GIN; la mantiene la propia base de datos.
+- SQLite: tabla virtual FTS5 notes_fts (rowid = note_id) que se sincroniza
+  desde los eventos de insert/update/delete de Notes. Lo que se escribe sin el
+  ORM (api/seed.py) no pasa por esos eventos y llama a rebuild_sqlite_fts().
+"""
+import re
+
+from sqlalchemy import event, inspect, text
+from api.models import db, Notes
+
+SEARCH_LANGUAGE = 'spanish'
+
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "title, content, tokenize='unicode61 remove_diacritics 2')"
+)
+
+POSTGRES_SEARCH_QUERY = text(
+    "SELECT note_id, ts_rank(search_vector, query) AS rank "
+    "FROM notes, websearch_to_tsquery(CAST(:language AS regconfig), :q) AS query "
+    "WHERE search_vector @@ query "
+    "ORDER BY rank DESC, note_id DESC LIMIT :limit OFFSET :offset"
+)
+
+# bm25() devuelve valores mas bajos para los mejores resultados
+SQLITE_SEARCH_QUERY = text(
+    "SELECT rowid AS note_id, bm25(notes_fts, 2.0, 1.0) AS rank "
+    "FROM notes_fts WHERE notes_fts MATCH :q "
+    "ORDER BY rank, rowid DESC LIMIT :limit OFFSET :offset"
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def to_fts5_query(raw):
+    # Cada palabra entre comillas para que la sintaxis de FTS5 (NEAR, OR, -, *)
+    # no se interprete; la ultima admite prefijo para buscar mientras se escribe
+    tokens = _TOKEN_RE.findall(raw)
+    if not tokens:
+        return None
+    quoted = ['"%s"' % token for token in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_note_ids(raw_query, limit, offset=0):
+    # Devuelve los note_id ordenados por relevancia
+    if db.engine.dialect.name == 'postgresql':
+        rows = db.session.execute(POSTGRES_SEARCH_QUERY, {
+            "language": SEARCH_LANGUAGE, "q": raw_query, "limit": limit, "offset": offset
+        })
+    else:
+        fts_query = to_fts5_query(raw_query)
+        if fts_query is None:
+            return []
+        rows = db.session.execute(SQLITE_SEARCH_QUERY, {
+            "q": fts_query, "limit": limit, "offset": offset
+        })
+    return [row.note_id for row in rows]
+
+
+def rebuild_sqlite_fts(connection):
+    # Vuelve a llenar notes_fts desde notes; en Postgres no hace nada
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.execute(text("DELETE FROM notes_fts"))
+    connection.execute(text(
+        "INSERT INTO notes_fts(rowid, title, content) SELECT note_id, title, content FROM notes"
+    ))
+
+
+@event.listens_for(db.Model.metadata, 'after_create')
+def _create_sqlite_fts(target, connection, **kw):
+    # db.create_all() en SQLite (desarrollo) tambien crea la tabla FTS
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(SQLITE_FTS_DDL))
+
+
+@event.listens_for(Notes, 'after_insert')
+def _fts_insert(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(
+            "INSERT INTO notes_fts(rowid, title, content) VALUES (:id, :title, :content)"
+        ), {"id": target.note_id, "title": target.title, "content": target.content})
+
+
+@event.listens_for(Notes, 'after_update')
+def _fts_update(mapper, connection, target):
+    if connection.dialect.name != 'sqlite':
+        return
+    state = inspect(target)
+    if not (state.attrs.title.history.has_changes() or state.attrs.content.history.has_changes()):
+        return
+    connection.execute(text("DELETE FROM notes_fts WHERE rowid = :id"), {"id": target.note_id})
+    connection.execute(text(
+        "INSERT INTO notes_fts(rowid, title, content) VALUES (:id, :title, :content)"
+    ), {"id": target.note_id, "title": target.title, "content": target.content})
+
+
+@event.listens_for(Notes, 'after_delete')
+def _fts_delete(mapper, connection, target):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("DELETE FROM notes_fts WHERE rowid = :id"), {"id": target.note_id})
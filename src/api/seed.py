@@ -0,0 +1,325 @@
+"""
+Generador de datos sinteticos para staging y benchmarks.
+
+seed_database() llena una base vacia con todas las tablas de api/models.py
+(usuarios, tags, notas y sus tags, comentarios, votos de notas y de
+comentarios, favoritos, reportes y notificaciones) y deja coherentes los
+contadores desnormalizados (positive_votes/negative_votes,
+unread_notifications, trending_score):
+    $ flask seed --scale 100 --seed 42
+
+- Las filas se generan en streaming y se escriben por lotes: COPY en Postgres
+  (psycopg2) y executemany en el resto. Nunca hay una tabla entera en memoria,
+  solo unos arrays con el autor y la fecha de cada nota y comentario.
+- Las claves primarias se asignan aqui (1..n) y al final se ajustan las
+  secuencias de Postgres, asi las relaciones no necesitan releer ids.
+- La contrasena se hashea una sola vez y la comparten todos los usuarios
+  (SEED_PASSWORD); user1@example.com es admin.
+- Con la misma semilla, tamanos y --now la salida es identica fila a fila.
+  Cada tabla usa su propio generador, asi cambiar un tamano no cambia el resto.
+"""
+import csv
+import datetime
+import io
+import random
+from array import array
+
+from sqlalchemy import func, select, text, update
+
+from api.models import db, User, Notes, Comments, Tags, Votes, UserNoteFavorites, Reports, Notifications, note_tags, normalize_tag_name
+from api.passwords import password_hasher
+from api.search import rebuild_sqlite_fts
+from api.trending import rebuild_trending
+
+SEED_PASSWORD = "seed-password"
+CHUNK_SIZE = 5000
+
+# tamanos con --scale 1 (unas 47.000 filas con note_tags); --scale 100 da unos 4,7 millones
+DEFAULT_SIZES = {
+    "users": 1000,
+    "tags": 30,
+    "notes": 5000,
+    "comments": 10000,
+    "note_votes": 10000,
+    "comment_votes": 3000,
+    "favorites": 3000,
+    "reports": 100,
+    "notifications": 5000,
+}
+
+# las notas/usuarios con indice bajo reciben mas actividad (cola larga)
+SKEW = 2.0
+HISTORY_DAYS = 180
+
+FIRST_NAMES = ("Ana", "Luis", "Maria", "Carlos", "Lucia", "Jorge", "Sofia", "Diego", "Elena", "Pablo",
+               "Valeria", "Andres", "Camila", "Miguel", "Daniela", "Javier", "Paula", "Sergio")
+LAST_NAMES = ("Garcia", "Rodriguez", "Martinez", "Lopez", "Gonzalez", "Perez", "Sanchez", "Ramirez",
+              "Torres", "Flores", "Rivera", "Gomez", "Diaz", "Cruz", "Morales", "Ortiz")
+TAG_NAMES = ("Deportes", "Culinario", "Salud Mental", "Relaciones amorosas", "Trabajo", "Estudios",
+             "Familia", "Amistad", "Viajes", "Musica", "Cine", "Libros", "Tecnologia", "Videojuegos",
+             "Mascotas", "Dinero", "Ciudad", "Naturaleza", "Arte", "Moda")
+WORDS = ("hoy", "ayer", "siempre", "nunca", "casa", "trabajo", "amigo", "familia", "tiempo", "vida",
+         "noche", "dia", "ciudad", "musica", "libro", "viaje", "idea", "problema", "historia", "cambio",
+         "quiero", "pienso", "siento", "creo", "necesito", "espero", "recuerdo", "busco", "mucho", "poco",
+         "nuevo", "viejo", "mejor", "peor", "feliz", "triste", "raro", "normal", "mismo", "otro")
+REPORT_REASONS = ("Spam", "Contenido ofensivo", "Acoso", "Informacion personal", "Otro")
+REPORT_STATUSES = ("pending", "pending", "pending", "reviewed", "dismissed")
+
+VOTE_COLUMNS = ("vote_id", "user_id", "note_id", "comment_id", "vote_type")
+
+
+def scaled_sizes(scale=1.0, **overrides):
+    sizes = {name: max(int(count * scale), 0) for name, count in DEFAULT_SIZES.items()}
+    sizes.update({name: count for name, count in overrides.items() if count is not None})
+    sizes["users"] = max(sizes["users"], 1)
+    return sizes
+
+
+class BulkWriter:
+    # COPY ... FROM STDIN con psycopg2, executemany en el resto
+
+    def __init__(self, connection, chunk_size=CHUNK_SIZE):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.copy = connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2"
+
+    def write(self, table, columns, rows):
+        count = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self._flush(table, columns, chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            self._flush(table, columns, chunk)
+            count += len(chunk)
+        return count
+
+    def _flush(self, table, columns, chunk):
+        if not self.copy:
+            self.connection.execute(table.insert(), [dict(zip(columns, row)) for row in chunk])
+            return
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in chunk:
+            # en CSV un campo vacio sin comillas es NULL
+            writer.writerow(["" if value is None else value.isoformat(sep=" ")
+                             if isinstance(value, datetime.datetime) else value for value in row])
+        buffer.seek(0)
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        cursor = self.connection.connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY "{table.name}" ({quoted}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+
+
+def _rng(seed, table):
+    return random.Random(f"{seed}:{table}")
+
+
+def _skewed(rng, count):
+    # indice 0..count-1, mas probable cuanto mas bajo
+    return min(int(count * rng.random() ** SKEW), count - 1)
+
+
+def _allocate(rng, total, buckets, cap):
+    # reparte total entre buckets con cola larga y sin pasar de cap por bucket
+    counts = array("i", [0]) * buckets
+    if not buckets or not cap:
+        return counts
+    for _ in range(min(total, buckets * cap)):
+        index = _skewed(rng, buckets)
+        # bucket lleno: el siguiente con hueco (siempre queda alguno)
+        while counts[index] >= cap:
+            index = (index + 1) % buckets
+        counts[index] += 1
+    return counts
+
+
+def _sentence(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+
+def _after(rng, start, now):
+    return start + datetime.timedelta(seconds=rng.random() * (now - start).total_seconds())
+
+
+def _distinct_actor(rng, users, recipient):
+    actor = rng.randint(1, users)
+    if actor == recipient and users > 1:
+        actor = actor % users + 1
+    return actor
+
+
+def seed_database(sizes=None, seed=42, now=None, log=print):
+    """Devuelve {tabla: filas escritas}. La base tiene que estar vacia."""
+    sizes = sizes or scaled_sizes()
+    now = now or datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = now - datetime.timedelta(days=HISTORY_DAYS)
+    users, tags, notes, comments = sizes["users"], sizes["tags"], sizes["notes"], sizes["comments"]
+    if not notes and (comments or sizes["note_votes"] or sizes["favorites"]
+                      or sizes["reports"] or sizes["notifications"]):
+        raise ValueError("comments, votes, favorites, reports and notifications need notes")
+
+    # una sola vez: bcrypt cuesta lo mismo para un usuario que para un millon
+    password_hash = password_hasher.generate_password_hash(SEED_PASSWORD)
+    written = {}
+
+    def user_rows(rng):
+        for user_id in range(1, users + 1):
+            yield (user_id, f"user{user_id}@example.com", f"user{user_id}", password_hash, True,
+                   rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                   _sentence(rng, 4, 15) if rng.random() < 0.3 else None,
+                   "admin" if user_id == 1 else "user", _after(rng, start, now), 0)
+
+    def tag_rows():
+        for tag_id in range(1, tags + 1):
+            name = TAG_NAMES[tag_id - 1] if tag_id <= len(TAG_NAMES) else f"Tag {tag_id}"
+            yield (tag_id, name, normalize_tag_name(name))
+
+    note_owner = array("i", [0]) * notes
+    note_time = array("d", [0.0]) * notes
+
+    def note_rows(rng):
+        for index in range(notes):
+            note_owner[index] = _skewed(rng, users) + 1
+            created_at = _after(rng, start, now)
+            note_time[index] = created_at.timestamp()
+            yield (index + 1, note_owner[index], _sentence(rng, 2, 8)[:100], _sentence(rng, 15, 120),
+                   rng.random() < 0.15, created_at, created_at, 0, 0, 0.0)
+
+    def note_tag_rows(rng):
+        for note_id in range(1, notes + 1):
+            for tag_id in rng.sample(range(1, tags + 1), min(rng.randint(1, 3), tags)):
+                yield (note_id, tag_id)
+
+    comment_note = array("i", [0]) * comments
+    comment_owner = array("i", [0]) * comments
+
+    def comment_rows(rng):
+        for index in range(comments):
+            note_index = _skewed(rng, notes)
+            comment_note[index] = note_index + 1
+            comment_owner[index] = rng.randint(1, users)
+            created_at = _after(rng, datetime.datetime.fromtimestamp(note_time[note_index]), now)
+            yield (index + 1, note_index + 1, comment_owner[index], _sentence(rng, 3, 40),
+                   created_at, created_at, 0, 0)
+
+    def vote_rows(rng, first_id, targets, total, on_comments):
+        vote_id = first_id
+        for index, count in enumerate(_allocate(rng, total, targets, users)):
+            note_id, comment_id = (None, index + 1) if on_comments else (index + 1, None)
+            for user_id in rng.sample(range(1, users + 1), count):
+                yield (vote_id, user_id, note_id, comment_id, 1 if rng.random() < 0.75 else -1)
+                vote_id += 1
+
+    def favorite_rows(rng):
+        for index, count in enumerate(_allocate(rng, sizes["favorites"], users, notes)):
+            for note_index in rng.sample(range(notes), count):
+                created_at = _after(rng, datetime.datetime.fromtimestamp(note_time[note_index]), now)
+                yield (index + 1, note_index + 1, created_at)
+
+    def report_rows(rng):
+        for report_id in range(1, sizes["reports"] + 1):
+            on_comment = comments and rng.random() < 0.4
+            yield (report_id,
+                   None if on_comment else _skewed(rng, notes) + 1,
+                   rng.randint(1, comments) if on_comment else None,
+                   rng.randint(1, users), rng.choice(REPORT_REASONS), rng.choice(REPORT_STATUSES),
+                   _after(rng, start, now))
+
+    def notification_rows(rng):
+        # mismos campos que deja el fan-out de api/notifications.py
+        for notification_id in range(1, sizes["notifications"] + 1):
+            kind = rng.choice(("comment", "note_vote", "comment_vote")) if comments else "note_vote"
+            if kind == "note_vote":
+                note_index = _skewed(rng, notes)
+                recipient, note_id, comment_id = note_owner[note_index], note_index + 1, None
+            else:
+                comment_index = rng.randrange(comments)
+                note_id, comment_id = comment_note[comment_index], comment_index + 1
+                recipient = note_owner[note_id - 1] if kind == "comment" else comment_owner[comment_index]
+            yield (notification_id, recipient, note_id, comment_id, rng.random() < 0.6,
+                   _after(rng, start, now), kind, _distinct_actor(rng, users, recipient))
+
+    steps = (
+        (User.__table__, ("id", "email", "username", "password_hash", "is_active", "first_name",
+                          "last_name", "bio", "role", "created_at", "unread_notifications"),
+         lambda: user_rows(_rng(seed, "user"))),
+        (Tags.__table__, ("tag_id", "name", "name_normalized"), tag_rows),
+        (Notes.__table__, ("note_id", "user_id", "title", "content", "is_anonymous", "created_at",
+                           "updated_at", "positive_votes", "negative_votes", "trending_score"),
+         lambda: note_rows(_rng(seed, "notes"))),
+        (note_tags, ("note_id", "tag_id"), lambda: note_tag_rows(_rng(seed, "note_tags"))),
+        (Comments.__table__, ("comment_id", "note_id", "user_id", "content", "created_at", "updated_at",
+                              "positive_votes", "negative_votes"),
+         lambda: comment_rows(_rng(seed, "comments"))),
+        (Votes.__table__, VOTE_COLUMNS,
+         lambda: vote_rows(_rng(seed, "note_votes"), 1, notes, sizes["note_votes"], False)),
+        (Votes.__table__, VOTE_COLUMNS,
+         lambda: vote_rows(_rng(seed, "comment_votes"), written["votes"] + 1, comments,
+                           sizes["comment_votes"], True)),
+        (UserNoteFavorites.__table__, ("user_id", "note_id", "created_at"),
+         lambda: favorite_rows(_rng(seed, "favorites"))),
+        (Reports.__table__, ("report_id", "note_id", "comment_id", "reporter_user_id", "reason",
+                             "status", "created_at"),
+         lambda: report_rows(_rng(seed, "reports"))),
+        (Notifications.__table__, ("notification_id", "recipient_user_id", "note_id", "comment_id",
+                                   "is_read", "created_at", "kind", "actor_user_id"),
+         lambda: notification_rows(_rng(seed, "notifications"))),
+    )
+
+    with db.engine.connect() as connection:
+        with connection.begin():
+            if connection.execute(select(User.id).limit(1)).first() is not None:
+                raise ValueError("the database already has users; seed needs an empty database")
+        writer = BulkWriter(connection)
+        # una transaccion por tabla; begin() explicito para que tambien se
+        # confirme el COPY, que va directo por el cursor de psycopg2
+        for table, columns, rows in steps:
+            with connection.begin():
+                count = writer.write(table, columns, rows())
+            written[table.name] = written.get(table.name, 0) + count
+            log(f"{table.name}: {written[table.name]} filas")
+
+        with connection.begin():
+            _recount(connection)
+            if connection.dialect.name == "postgresql":
+                _reset_sequences(connection)
+            # el bulk insert no dispara los eventos de Notes que mantienen notes_fts
+            rebuild_sqlite_fts(connection)
+
+    rebuild_trending(now=now)
+    return written
+
+
+def _recount(connection):
+    # contadores desnormalizados: un UPDATE por tabla, las subconsultas van por indice
+    votes = Votes.__table__
+    for table, key, vote_key in ((Notes.__table__, Notes.__table__.c.note_id, votes.c.note_id),
+                                 (Comments.__table__, Comments.__table__.c.comment_id, votes.c.comment_id)):
+        def counted(vote_type):
+            return select(func.count()).where(
+                vote_key == key, votes.c.vote_type == vote_type).scalar_subquery()
+        # updated_at explicito: comments tiene onupdate=now() y cambiaria en cada seed
+        connection.execute(update(table).values(
+            positive_votes=counted(1), negative_votes=counted(-1), updated_at=table.c.updated_at))
+
+    notifications = Notifications.__table__
+    users = User.__table__
+    connection.execute(update(users).values(unread_notifications=select(func.count()).where(
+        notifications.c.recipient_user_id == users.c.id,
+        notifications.c.is_read.is_(False)).scalar_subquery()))
+
+
+def _reset_sequences(connection):
+    # las claves se pusieron a mano: la siguiente fila de la app sigue desde el maximo
+    for table, column in (("user", "id"), ("tags", "tag_id"), ("notes", "note_id"),
+                          ("comments", "comment_id"), ("votes", "vote_id"), ("reports", "report_id"),
+                          ("notifications", "notification_id")):
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', '{column}'), "
+            f"COALESCE((SELECT MAX({column}) FROM \"{table}\"), 0) + 1, false)"))
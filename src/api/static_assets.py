@@ -0,0 +1,120 @@
+"""
+Serving of the built frontend (dist/) from an in-memory manifest.
+
+The manifest is built once at startup by walking dist/, so a request never
+needs to stat the filesystem to decide what to send. Vite's content-hashed
+assets (assets/name-<hash>.js) are served with a one year immutable cache,
+everything else must be revalidated. When a precompressed sibling exists
+(file.js.br / file.js.gz, see `flask compress-static`) it is sent instead if
+the client accepts that encoding. Unknown paths fall back to index.html so
+the React router can handle them.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from flask import request, send_file, abort
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+# name-<hash>.ext as produced by Vite for everything under assets/
+_HASHED_ASSET_RE = re.compile(r'^assets/.+[-.][A-Za-z0-9_-]{8,}\.\w+$')
+
+# only text-like assets are worth compressing
+COMPRESSIBLE_EXTENSIONS = {'.js', '.mjs', '.css', '.html', '.svg', '.json', '.txt', '.map', '.ico', '.xml'}
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticManifest:
+
+    def __init__(self, directory, index='index.html'):
+        self.directory = directory
+        self.index = index
+        self.files = {}
+        self.refresh()
+
+    def refresh(self):
+        files = {}
+        if os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    full_path = os.path.join(root, name)
+                    rel_path = os.path.relpath(full_path, self.directory).replace(os.sep, '/')
+                    files[rel_path] = full_path
+
+        manifest = {}
+        for rel_path, full_path in files.items():
+            if rel_path.endswith(('.br', '.gz')) and rel_path[:-3] in files:
+                continue
+            manifest[rel_path] = {
+                "path": full_path,
+                "mimetype": mimetypes.guess_type(rel_path)[0] or 'application/octet-stream',
+                "immutable": bool(_HASHED_ASSET_RE.match(rel_path)),
+                "encodings": {
+                    encoding: files[rel_path + suffix]
+                    for encoding, suffix in _ENCODINGS if rel_path + suffix in files
+                },
+            }
+        self.files = manifest
+
+    def lookup(self, path):
+        # SPA fallback: anything that is not a file in dist/ gets index.html
+        return self.files.get(path) or self.files.get(self.index)
+
+    def send(self, path):
+        entry = self.lookup(path)
+        if entry is None:
+            abort(404)
+
+        file_path = entry["path"]
+        content_encoding = None
+        for encoding, _ in _ENCODINGS:
+            if encoding in entry["encodings"] and request.accept_encodings[encoding] > 0:
+                file_path = entry["encodings"][encoding]
+                content_encoding = encoding
+                break
+
+        max_age = 31536000 if entry["immutable"] else None
+        response = send_file(file_path, mimetype=entry["mimetype"], max_age=max_age, conditional=True)
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+        if entry["encodings"]:
+            response.vary.add('Accept-Encoding')
+        if entry["immutable"]:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        else:
+            # must revalidate with the ETag every time (index.html, favicon...)
+            response.cache_control.no_cache = True
+            response.cache_control.max_age = 0
+        return response
+
+
+def compress_static(directory):
+    """
+    Writes .gz (and .br if the brotli module is installed) next to every
+    compressible file in directory. Returns the number of files written.
+    """
+    written = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as source:
+                data = source.read()
+
+            outputs = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                outputs.append(('.br', brotli.compress(data, quality=11)))
+            for suffix, compressed in outputs:
+                # only worth it if it actually saves bytes
+                if len(compressed) < len(data):
+                    with open(path + suffix, 'wb') as out:
+                        out.write(compressed)
+                    written += 1
+    return written
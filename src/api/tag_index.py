@@ -0,0 +1,130 @@
+import bisect
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from api.models import db, Tags
+from api.cache import response_cache
+
+
+class TagIndex:
+    """
+    Registro en memoria de los tags de cada worker: un array ordenado por
+    nombre normalizado (autocompletar por prefijo con bisect) y la lista por
+    id para get_tags. El vocabulario de tags es pequeño, asi que cabe entero;
+    si supera max_size el registro se desactiva y quien lo use consulta la
+    base de datos.
+
+    version sube con cada invalidacion (alta, edicion o baja de tags) y es la
+    clave de lo cargado: se recarga si cambio o si vencio el ttl.
+    """
+
+    def __init__(self, max_size=5000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        # (keys, entries, all, enabled, loaded_at, version) o None; se
+        # reemplaza entero en una asignacion para que ningun hilo vea una
+        # mezcla de la carga vieja y la nueva
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def invalidate(self):
+        self.version += 1
+
+    def _load(self):
+        # la version se lee antes de consultar: si alguien invalida mientras
+        # tanto, la siguiente llamada vuelve a cargar
+        version = self.version
+        rows = db.session.query(Tags.tag_id, Tags.name, Tags.name_normalized).order_by(
+            Tags.name_normalized).limit(self.max_size + 1).all()
+        enabled = len(rows) <= self.max_size
+        keys = [row.name_normalized for row in rows] if enabled else []
+        entries = [{"tag_id": row.tag_id, "name": row.name} for row in rows] if enabled else []
+        all_ = sorted(entries, key=lambda entry: entry["tag_id"])
+        self._snapshot = (keys, entries, all_, enabled, time.monotonic(), version)
+
+    def _fresh(self, snapshot):
+        return (snapshot is not None and snapshot[5] == self.version
+                and time.monotonic() - snapshot[4] < self.ttl)
+
+    def _current(self):
+        snapshot = self._snapshot
+        if self._fresh(snapshot):
+            return snapshot
+        with self._lock:
+            if not self._fresh(self._snapshot):
+                self._load()
+            return self._snapshot
+
+    def suggest(self, prefix, limit=10):
+        # devuelve None si el indice esta desactivado (vocabulario demasiado grande)
+        keys, entries, _, enabled, _, _ = self._current()
+        if not enabled:
+            return None
+        start = bisect.bisect_left(keys, prefix)
+        results = []
+        for i in range(start, len(keys)):
+            if len(results) >= limit or not keys[i].startswith(prefix):
+                break
+            results.append(entries[i])
+        return results
+
+    def all_tags(self):
+        # todos los tags ordenados por id, o None si el registro esta desactivado
+        _, _, all_, enabled, _, _ = self._current()
+        return list(all_) if enabled else None
+
+
+def prefix_condition(prefix):
+    # Condicion de prefijo que puede usar el indice de tags.name_normalized:
+    # en Postgres LIKE 'x%' con el indice text_pattern_ops, en SQLite un rango
+    # sobre la colacion BINARY (su LIKE es case-insensitive y no usaria el indice)
+    if db.engine.dialect.name == 'postgresql':
+        return Tags.name_normalized.startswith(prefix, autoescape=True)
+    return db.and_(Tags.name_normalized >= prefix,
+                   Tags.name_normalized < prefix + '\U0010ffff')
+
+
+def suggest_tags_from_db(prefix, limit=10):
+    rows = db.session.query(Tags.tag_id, Tags.name).filter(
+        prefix_condition(prefix)).order_by(Tags.name_normalized).limit(limit).all()
+    return [{"tag_id": row.tag_id, "name": row.name} for row in rows]
+
+
+tag_index = TagIndex()
+
+
+# cualquier alta, edicion o baja de tags en este proceso (p. ej. desde el admin)
+# invalida el indice, pero solo cuando se confirma la transaccion: si se
+# invalidara en el flush, otro hilo podria recargar antes del commit y guardar
+# los tags de antes hasta el siguiente cambio. Los demas workers lo recargan al
+# vencer el ttl
+@event.listens_for(Tags, 'after_insert')
+@event.listens_for(Tags, 'after_delete')
+def _mark_tags_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["tags_changed"] = True
+
+
+@event.listens_for(Tags, 'after_update')
+def _mark_tags_changed_on_update(mapper, connection, target):
+    # al crear una nota su backref tags.notes tambien "actualiza" el tag;
+    # solo marcamos si cambio alguna columna
+    state = inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+        _mark_tags_changed(mapper, connection, target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_tag_index(session):
+    if session.info.pop("tags_changed", False):
+        tag_index.invalidate()
+        response_cache.invalidate("tags")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_tag_changes(session):
+    session.info.pop("tags_changed", None)
@@ -0,0 +1,108 @@
+"""
+Ranking "trending" de notas (/api/notes/trending).
+
+notes.trending_score esta materializado e indexado con (trending_score,
+note_id), asi que el feed es un recorrido del indice en orden inverso, sin
+agregar votos ni comentarios al leer. Las escrituras lo suben en la misma
+transaccion con un UPDATE ... SET trending_score = trending_score + peso:
+- nota nueva: empieza con TRENDING_WEIGHTS["note"]
+- voto: +/- TRENDING_WEIGHTS["vote"] (adjust_vote_counters)
+- comentario y favorito: su peso; al borrarlos, unbump_trending() resta ese
+  peso ya decaido desde que se sumo, sin bajar de 0
+
+El decaimiento en el tiempo lo hace un job periodico que multiplica todos los
+scores por 0.5 ** (horas / TRENDING_HALF_LIFE_HOURS):
+    $ flask decay-trending --hours 1      (cada hora, por cron)
+    $ flask decay-trending --rebuild      (recalcula todo desde los contadores)
+"""
+import datetime
+import os
+
+from sqlalchemy import case, func, update
+
+from api.models import db, Notes, Comments, UserNoteFavorites
+
+TRENDING_WEIGHTS = {
+    "note": 1.0,
+    "vote": 1.0,
+    "comment": 2.0,
+    "favorite": 3.0,
+}
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+
+# por debajo de esto el score se deja en 0 y el job deja de tocar la fila
+TRENDING_FLOOR = 0.001
+
+
+def bump_trending(note_id, delta):
+    db.session.query(Notes).filter(Notes.note_id == note_id).update(
+        {Notes.trending_score: Notes.trending_score + delta}, synchronize_session=False)
+
+
+def unbump_trending(note_id, weight, acted_at, now=None):
+    # Deshace un bump de hace tiempo: el peso ya decayo desde acted_at, y si el
+    # job no ha corrido a la vez lo restado podria pasarse, asi que el score no
+    # baja de 0 (si ya era negativo por votos, no se toca)
+    now = now or datetime.datetime.utcnow()
+    hours = max((now - acted_at).total_seconds() / 3600, 0) if acted_at else 0
+    delta = weight * decay_factor(hours)
+    remaining = Notes.trending_score - delta
+    db.session.query(Notes).filter(Notes.note_id == note_id).update(
+        {Notes.trending_score: case((remaining >= 0, remaining),
+                                    (Notes.trending_score >= 0, 0.0),
+                                    else_=Notes.trending_score)},
+        synchronize_session=False)
+
+
+def decay_factor(hours):
+    return 0.5 ** (hours / TRENDING_HALF_LIFE_HOURS)
+
+
+def decay_trending(hours):
+    # un solo UPDATE sobre las notas que todavia puntuan
+    factor = decay_factor(hours)
+    decayed = Notes.trending_score * factor
+    result = db.session.execute(
+        update(Notes).where(Notes.trending_score != 0).values(
+            trending_score=case((func.abs(decayed) < TRENDING_FLOOR, 0.0), else_=decayed))
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def rebuild_trending(chunk_size=1000, now=None):
+    # Recalcula desde los contadores, decayendo por la edad de la nota (los
+    # votos no guardan fecha). Aproxima lo que dejan las escrituras; sirve
+    # para rellenar la columna o corregirla.
+    now = now or datetime.datetime.utcnow()
+    last_id = 0
+    total = 0
+    while True:
+        notes = db.session.query(
+            Notes.note_id, Notes.created_at, Notes.positive_votes, Notes.negative_votes
+        ).filter(Notes.note_id > last_id).order_by(Notes.note_id).limit(chunk_size).all()
+        if not notes:
+            break
+        note_ids = [row.note_id for row in notes]
+        comments = dict(db.session.query(Comments.note_id, func.count()).filter(
+            Comments.note_id.in_(note_ids)).group_by(Comments.note_id).all())
+        favorites = dict(db.session.query(UserNoteFavorites.note_id, func.count()).filter(
+            UserNoteFavorites.note_id.in_(note_ids)).group_by(UserNoteFavorites.note_id).all())
+
+        scores = []
+        for note in notes:
+            raw = (TRENDING_WEIGHTS["note"]
+                   + TRENDING_WEIGHTS["vote"] * (note.positive_votes - note.negative_votes)
+                   + TRENDING_WEIGHTS["comment"] * comments.get(note.note_id, 0)
+                   + TRENDING_WEIGHTS["favorite"] * favorites.get(note.note_id, 0))
+            age_hours = max((now - note.created_at).total_seconds() / 3600, 0) if note.created_at else 0
+            score = raw * decay_factor(age_hours)
+            scores.append({"note_id": note.note_id,
+                           "trending_score": score if abs(score) >= TRENDING_FLOOR else 0.0})
+
+        db.session.execute(update(Notes), scores)
+        db.session.commit()
+        total += len(scores)
+        last_id = note_ids[-1]
+    return total
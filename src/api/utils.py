@@ -1,4 +1,7 @@
 from flask import jsonify, url_for
+import base64
+import datetime
+import json
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +18,51 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(created_at, row_id):
+    # Cursor opaco para paginacion por keyset: (created_at, id) en base64
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, row_id = json.loads(raw)
+        created_at = datetime.datetime.fromisoformat(created_at) if created_at else None
+        return created_at, int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise APIException("Cursor inválido", status_code=400)
+
+def encode_score_cursor(score, row_id):
+    # Igual que encode_cursor pero para listados ordenados por un score numerico
+    raw = json.dumps([score, row_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_score_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        score, row_id = json.loads(raw)
+        return float(score), int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise APIException("Cursor inválido", status_code=400)
+
+def encode_offset_cursor(offset):
+    # Para listados ordenados por relevancia, donde no hay una clave estable
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode('utf-8')).decode('ascii')
+
+def decode_offset_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        return max(0, int(json.loads(raw)["offset"]))
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        raise APIException("Cursor inválido", status_code=400)
+
+def parse_limit(value, default=20, maximum=100):
+    try:
+        limit = int(value) if value is not None else default
+    except (ValueError, TypeError):
+        raise APIException("El parámetro limit debe ser un número", status_code=400)
+    return max(1, min(limit, maximum))
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
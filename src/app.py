@@ -1,12 +1,20 @@
-from api.routes import api, bcrypt
+from api.routes import api
 import os
-from flask import Flask, request, jsonify, url_for, send_from_directory
+from flask import Flask, request, jsonify, url_for
 from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
 from flask_swagger import swagger
 
 from api.utils import APIException, generate_sitemap
 from api.models import db
+from api.passwords import password_hasher
+from api.google_auth import google_certs
+from api.static_assets import StaticManifest
+from api.notifications import notification_fanout
+from api.events import event_hub
+from api.db_pool import engine_options, init_pool_events
+from api.metrics import metrics
+from api.profiler import request_profiler
+from api.nplusone import nplusone_detector
 
 
 from api.admin import setup_admin
@@ -17,6 +25,8 @@ from flask_cors import CORS
 ENV = "development" if os.getenv("FLASK_DEBUG") == "1" else "production"
 static_file_dir = os.path.join(os.path.dirname(
     os.path.realpath(__file__)), '../dist/')
+# manifest of dist/ built once at startup (see api/static_assets.py)
+static_manifest = StaticManifest(static_file_dir)
 app = Flask(__name__)
 app.url_map.strict_slashes = False
 
@@ -32,11 +42,21 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# tamano del pool, timeouts, pre-ping y perfil pgbouncer (ver api/db_pool.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 MIGRATE = Migrate(app, db, compare_type=True)
 db.init_app(app)
+with app.app_context():
+    init_pool_events(db.engine)
+    metrics.init_app(app, db.engine)
+    request_profiler.init_app(app, db.engine)
+    nplusone_detector.init_app(app, db.engine)
 
 
-bcrypt.init_app(app)
+password_hasher.init_app(app)
+google_certs.init_app(app)
+notification_fanout.init_app(app)
+event_hub.init_app(app)
 
 app.config["JWT_SECRET_KEY"] = "clave-de-prueba-simple-sin-caracteres-raros"
 app.config["JWT_CSRF_PROTECTION"] = False
@@ -68,18 +88,17 @@ def handle_invalid_usage(error):
 def sitemap():
     if ENV == "development":
         return generate_sitemap(app)
-    return send_from_directory(static_file_dir, 'index.html')
+    return static_manifest.send('index.html')
 
 # any other endpoint will try to serve it like a static file
 
 
 @app.route('/<path:path>', methods=['GET'])
 def serve_any_other_file(path):
-    if not os.path.isfile(os.path.join(static_file_dir, path)):
-        path = 'index.html'
-    response = send_from_directory(static_file_dir, path)
-    response.cache_control.max_age = 0  # avoid cache memory
-    return response
+    # in development dist/ can be rebuilt while the server runs
+    if ENV == "development" and path not in static_manifest.files:
+        static_manifest.refresh()
+    return static_manifest.send(path)
 
 
 # this only runs if `$ python src/main.py` is executed
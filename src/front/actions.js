@@ -239,11 +239,13 @@ export const actions = (dispatch) => ({
     // FAVORITOS CON BACKEND
     // ===============================
 
-    getFavorites: () => {
+    // Pagina de favoritos; con cursor se agrega a las ya cargadas
+    getFavorites: (cursor = null) => {
         const token = localStorage.getItem("token");
         if (!token) return;
 
-        return fetch(`${backendUrl}/api/favorites`, {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        return fetch(`${backendUrl}/api/favorites${query}`, {
             method: "GET",
             headers: {
                 Authorization: `Bearer ${token}`,
@@ -252,7 +254,10 @@ export const actions = (dispatch) => ({
         })
             .then((resp) => resp.json())
             .then((data) => {
-                dispatch({ type: "SET_FAVORITES", payload: data });
+                dispatch({
+                    type: "SET_FAVORITES_PAGE",
+                    payload: { favorites: data.favorites, next_cursor: data.next_cursor, append: !!cursor },
+                });
                 console.log("✅ Favoritos cargados:", data);
             })
             .catch((error) => {
@@ -260,6 +265,26 @@ export const actions = (dispatch) => ({
             });
     },
 
+    // Solo los ids de los favoritos (para saber que corazones pintar)
+    getFavoriteIds: () => {
+        const token = localStorage.getItem("token");
+        if (!token) return;
+
+        return fetch(`${backendUrl}/api/favorites/ids`, {
+            method: "GET",
+            headers: {
+                Authorization: `Bearer ${token}`,
+            },
+        })
+            .then((resp) => resp.json())
+            .then((data) => {
+                dispatch({ type: "SET_FAVORITE_IDS", payload: data.note_ids || [] });
+            })
+            .catch((error) => {
+                console.error("❌ Error obteniendo ids de favoritos:", error);
+            });
+    },
+
     addFavorite: (noteId) => {
         const token = localStorage.getItem("token");
         if (!token) return;
@@ -39,7 +39,7 @@ export const Navbar = () => {
                             {/* Favoritos */}
                             <Dropdown>
                                 <Dropdown.Toggle id="favoritesDropdown">
-                                    Favoritos ({store.favorites.length})
+                                    Favoritos ({store.favoriteIds.length})
                                 </Dropdown.Toggle>
                                 <Dropdown.Menu style={{ maxHeight: "300px", overflowY: "auto" }}>
                                     {store.favorites.length === 0 && (
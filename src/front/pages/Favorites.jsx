@@ -58,6 +58,16 @@ const Favorites = () => {
           </div>
         ))}
       </div>
+      {store.favoritesNextCursor && (
+        <div className="text-center my-4">
+          <button
+            className="btn btn-outline-primary"
+            onClick={() => actions.getFavorites(store.favoritesNextCursor)}
+          >
+            Cargar más favoritos
+          </button>
+        </div>
+      )}
     </div>
   </div>
 );
@@ -8,6 +8,7 @@ export const Home = () => {
 
   const [notes, setNotes] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
   const [error, setError] = useState(null);
   const [userVotes, setUserVotes] = useState({});
   const [sortOption, setSortOption] = useState("recent");
@@ -21,6 +22,7 @@ export const Home = () => {
     fetchNotes();
 
     if (localStorage.getItem("token")) {
+      actions.getFavoriteIds();
       actions.getFavorites();
     }
   }, []);
@@ -31,32 +33,38 @@ export const Home = () => {
     navigate("/login");
   };
 
-  const fetchNotes = async () => {
+  const fetchNotes = async (cursor = null, term = activeSearchTerm) => {
     try {
-      setLoading(true);
-      const response = await fetch(`${backendUrl}/api/notes`);
+      if (!cursor) setLoading(true);
+      // con texto de busqueda usamos la busqueda de texto completo del backend
+      const params = new URLSearchParams();
+      if (term.trim()) params.set("q", term.trim());
+      if (cursor) params.set("cursor", cursor);
+      const path = term.trim() ? "/api/notes/search" : "/api/notes";
+      const query = params.toString() ? `?${params.toString()}` : "";
+      const response = await fetch(`${backendUrl}${path}${query}`);
 
       if (!response.ok) {
         throw new Error(`Error ${response.status}: ${response.statusText}`);
       }
 
-      const data = await response.json();
-      setNotes(data);
+      const page = await response.json();
+      const data = page.notes;
+      setNotes((prev) => (cursor ? [...prev, ...data] : data));
+      setNextCursor(page.next_cursor);
 
       const token = localStorage.getItem("token");
       if (token) {
         try {
-          const votePromises = data.map((note) =>
-            getUserVoteForNote(note.note_id || note.id)
-          );
-
-          const votes = await Promise.all(votePromises);
+          // votos del usuario para toda la pagina en una sola peticion
+          const state = await getViewerState(data.map((note) => note.note_id || note.id));
           const votesMap = {};
-          data.forEach((note, index) => {
-            votesMap[note.note_id || note.id] = votes[index];
+          data.forEach((note) => {
+            const noteId = note.note_id || note.id;
+            votesMap[noteId] = state.notes[noteId] ? state.notes[noteId].vote_type : 0;
           });
 
-          setUserVotes(votesMap);
+          setUserVotes((prev) => (cursor ? { ...prev, ...votesMap } : votesMap));
         } catch (voteError) {
           console.error("Error obteniendo votos:", voteError);
           setUserVotes({});
@@ -70,33 +78,33 @@ export const Home = () => {
     }
   };
 
-  const getUserVoteForNote = async (noteId) => {
+  const getViewerState = async (noteIds) => {
     const token = localStorage.getItem("token");
-    if (!token) return 0;
+    const empty = { notes: {}, comments: {} };
+    if (!token || noteIds.length === 0) return empty;
 
     try {
-      const response = await fetch(
-        `${backendUrl}api/votes/my-vote?note_id=${noteId}`,
-        {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        }
-      );
+      const response = await fetch(`${backendUrl}api/viewer-state`, {
+        method: "POST",
+        headers: {
+          Authorization: `Bearer ${token}`,
+          "Content-Type": "application/json",
+        },
+        body: JSON.stringify({ note_ids: noteIds }),
+      });
 
       if (response.status === 401) {
         handleTokenExpired();
-        return 0;
+        return empty;
       }
 
       if (response.ok) {
-        const data = await response.json();
-        return data.vote_type;
+        return await response.json();
       }
-      return 0;
+      return empty;
     } catch (error) {
-      console.error("Error obteniendo voto:", error);
-      return 0;
+      console.error("Error obteniendo votos:", error);
+      return empty;
     }
   };
 
@@ -189,7 +197,7 @@ export const Home = () => {
   };
 
   const isNoteFavorited = (noteId) => {
-    return store.favorites.some((fav) => (fav.note_id || fav.id) === noteId);
+    return store.favoriteIds.includes(noteId);
   };
 
   const toggleFavorite = async (note) => {
@@ -278,7 +286,7 @@ export const Home = () => {
         <div className="alert alert-danger" role="alert">
           <h4 className="alert-heading">Error al cargar las notas</h4>
           <p>{error}</p>
-          <button className="btn btn-primary" onClick={fetchNotes}>
+          <button className="btn btn-primary" onClick={() => fetchNotes()}>
             Reintentar
           </button>
         </div>
@@ -286,11 +294,7 @@ export const Home = () => {
     );
   }
 
-  const filteredNotes = notes.filter((note) => {
-    if (!activeSearchTerm.trim()) return true;
-    const title = (note.title || "").toLowerCase();
-    return title.includes(activeSearchTerm.toLowerCase());
-  });
+  const filteredNotes = notes;
 
   const sortedNotes = [...filteredNotes].sort((a, b) => {
     if (sortOption === "recent") {
@@ -312,11 +316,13 @@ export const Home = () => {
   const handleSearch = (e) => {
     e.preventDefault();
     setActiveSearchTerm(searchTerm);
+    fetchNotes(null, searchTerm);
   };
 
   const clearSearch = () => {
     setSearchTerm("");
     setActiveSearchTerm("");
+    fetchNotes(null, "");
   };
 
   return (
@@ -556,7 +562,11 @@ export const Home = () => {
 
       {sortedNotes.length > 0 && (
         <div className="text-center mt-5">
-          <button className="btn btn-outline-secondary" disabled>
+          <button
+            className="btn btn-outline-secondary"
+            disabled={!nextCursor}
+            onClick={() => fetchNotes(nextCursor)}
+          >
             Cargar más notas
           </button>
         </div>
@@ -44,20 +44,11 @@ const NoteDetail = () => {
         const data = await response.json();
         setComments(data.reverse());
         
-        // Obtener votos del usuario para los comentarios
+        // Obtener votos del usuario para los comentarios (una sola peticion)
         const token = localStorage.getItem("token");
-        if (token) {
-          const votePromises = data.map(comment => 
-            getUserVoteForComment(comment.comment_id)
-          );
-          
-          const votes = await Promise.all(votePromises);
-          const votesMap = {};
-          data.forEach((comment, index) => {
-            votesMap[comment.comment_id] = votes[index];
-          });
-          
-          setUserVotes(prev => ({...prev, ...votesMap}));
+        if (token && data.length > 0) {
+          const commentVotes = await getUserVotesForComments(data.map(comment => comment.comment_id));
+          setUserVotes(prev => ({...prev, ...commentVotes}));
         }
       } else {
         console.error("Error al obtener los comentarios.");
@@ -114,26 +105,33 @@ const NoteDetail = () => {
     }
   };
 
-  // Función para obtener el voto del usuario para un comentario
-  const getUserVoteForComment = async (commentId) => {
+  // Función para obtener los votos del usuario de varios comentarios a la vez
+  const getUserVotesForComments = async (commentIds) => {
     const token = localStorage.getItem("token");
-    if (!token) return 0;
+    if (!token) return {};
     
     try {
-      const response = await fetch(`${API_URL}/api/votes/my-vote?comment_id=${commentId}`, {
+      const response = await fetch(`${API_URL}/api/viewer-state`, {
+        method: "POST",
         headers: {
-          'Authorization': `Bearer ${token}`
-        }
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ comment_ids: commentIds })
       });
       
       if (response.ok) {
         const data = await response.json();
-        return data.vote_type;
+        const votesMap = {};
+        commentIds.forEach(commentId => {
+          votesMap[commentId] = data.comments[commentId] ? data.comments[commentId].vote_type : 0;
+        });
+        return votesMap;
       }
-      return 0;
+      return {};
     } catch (error) {
-      console.error("Error obteniendo voto:", error);
-      return 0;
+      console.error("Error obteniendo votos:", error);
+      return {};
     }
   };
 
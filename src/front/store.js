@@ -12,6 +12,8 @@ export const initialStore = () => {
 
     // === FAVORITOS ===
     favorites: [], // Agregado para almacenar favoritos
+    favoritesNextCursor: null, // cursor de la siguiente pagina de /api/favorites
+    favoriteIds: [], // solo ids, para marcar los corazones del feed
   };
 };
 
@@ -48,6 +50,8 @@ export default function storeReducer(store, action = {}) {
         token: null,
         user: null,
         favorites: [], // Limpiar favoritos al hacer logout
+        favoritesNextCursor: null,
+        favoriteIds: [],
       };
 
     // === ACCIONES PARA FAVORITOS ===
@@ -55,6 +59,7 @@ export default function storeReducer(store, action = {}) {
       return {
         ...store,
         favorites: [...store.favorites, action.payload],
+        favoriteIds: [...store.favoriteIds, action.payload.note_id],
       };
     case "REMOVE_FAVORITE": // Remueve un favorito por id
       return {
@@ -63,12 +68,26 @@ export default function storeReducer(store, action = {}) {
         favorites: store.favorites.filter(
           (fav) => (fav.note_id || fav.id) !== action.payload
         ),
+        favoriteIds: store.favoriteIds.filter((id) => id !== action.payload),
       };
     case "SET_FAVORITES": // Establece lista completa de favoritos (útil para inicializar)
       return {
         ...store,
         favorites: action.payload,
       };
+    case "SET_FAVORITES_PAGE": // Pagina de /api/favorites; append suma a las ya cargadas
+      return {
+        ...store,
+        favorites: action.payload.append
+          ? [...store.favorites, ...action.payload.favorites]
+          : action.payload.favorites,
+        favoritesNextCursor: action.payload.next_cursor,
+      };
+    case "SET_FAVORITE_IDS":
+      return {
+        ...store,
+        favoriteIds: action.payload,
+      };
 
     default:
       return store;